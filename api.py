@@ -1,26 +1,36 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, text
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
+from sqlalchemy import text
 import os
+import json
+import codecs
+import time
+import asyncio
 import decimal
-from message_generator import calculate_progress_percent, detect_progress_change, generate_message
+from db import init_engines, dispose_engines, run_db, stream_rows
+from projections import is_goal_on_track, project_goals, projection_curves
+from vector_sync import sync_goals_quietly, sync_status
+from chat_cache import invalidate_goal, cache_stats
+from metrics import log_event, render_metrics
+from response_cache import response_cache, CLIENTS_SCOPE, client_scope
+from bulk_import import RowParser, BulkImporter, BULK_IMPORT_BATCH_SIZE
+from recipients import registry as recipient_registry, RecipientImporter, RECIPIENT_IMPORT_BATCH_SIZE
+from intent_router import route_question, router_stats, find_clients
+from message_generator import calculate_progress_percent, detect_progress_change, generate_message, pooled_message, template_fallback, MESSAGE_LLM_TIMEOUT
+from message_pool import pool as message_pool
 from pydantic import BaseModel, Field
 import openai
 from dotenv import load_dotenv
-from langchain_rag import langchain_ai_chat
-from send_sms import send_sms
+from langchain_rag import init_rag, rag_status, langchain_ai_chat, langchain_ai_chat_stream
+from sms_dispatch import dispatcher
 
 # Load environment variables from .env
 load_dotenv()
 
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_PORT = os.getenv('DB_PORT', '5432')
-DB_NAME = os.getenv('DB_NAME', 'investment_db')
-DB_USER = os.getenv('DB_USER', 'user')
-DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
-
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
 # Azure OpenAI config from environment
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
@@ -32,7 +42,33 @@ openai.api_base = AZURE_OPENAI_ENDPOINT
 openai.api_version = AZURE_OPENAI_VERSION
 openai.api_key = AZURE_OPENAI_KEY
 
-app = FastAPI()
+# The RAG pipeline is built after the server starts accepting requests rather than at import,
+# and the vector index is caught up in the same background task instead of before uvicorn starts
+RAG_WARMUP_ON_STARTUP = os.getenv("RAG_WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+VECTOR_SYNC_ON_STARTUP = os.getenv("VECTOR_SYNC_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+READYZ_DB_TIMEOUT = float(os.getenv("READYZ_DB_TIMEOUT", "2"))
+# Load stored message templates and queue generation for missing ones in the background
+MESSAGE_POOL_PREFILL_ON_STARTUP = os.getenv("MESSAGE_POOL_PREFILL_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+async def warm_up_rag():
+    ready = await asyncio.to_thread(init_rag)
+    if ready and VECTOR_SYNC_ON_STARTUP:
+        await asyncio.to_thread(sync_goals_quietly, None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled engine per process, shared by every handler and rag_utils
+    init_engines()
+    warm_up = asyncio.create_task(warm_up_rag()) if RAG_WARMUP_ON_STARTUP else None
+    prefill = asyncio.create_task(asyncio.to_thread(message_pool.prefill)) if MESSAGE_POOL_PREFILL_ON_STARTUP else None
+    yield
+    for task in (warm_up, prefill):
+        if task is not None:
+            task.cancel()
+    await asyncio.to_thread(message_pool.shutdown)
+    await dispose_engines()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +78,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+def _ping_db(conn):
+    conn.execute(text("SELECT 1"))
+
+@app.get("/readyz")
+async def readyz(require_rag: bool = False):
+    """
+    Readiness per subsystem. The database gates readiness; RAG only does with require_rag=true,
+    so the non-chat endpoints can take traffic while the pipeline is still warming up.
+    """
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(run_db(_ping_db), READYZ_DB_TIMEOUT)
+        database = {"status": "ready", "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+    except Exception as e:
+        database = {"status": "failed", "error": str(e) or type(e).__name__}
+    rag = rag_status()
+    ready = database["status"] == "ready" and (not require_rag or rag["status"] == "ready")
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "subsystems": {"database": database, "rag": rag, "vector_sync": sync_status()},
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 def convert_decimals(obj):
     if isinstance(obj, dict):
         return {k: convert_decimals(v) for k, v in obj.items()}
@@ -52,158 +118,574 @@ def convert_decimals(obj):
     else:
         return obj
 
+def _fetch_clients(conn):
+    result = conn.execute(text("SELECT id, client_name FROM clients ORDER BY client_name"))
+    return [dict(row._mapping) for row in result]
+
+# What the cached reads depend on, cheap enough to read on every request. Clients are only ever
+# added. A client's goals change with their history: history_count rises on every insert, and the
+# row versions (xmin) of goals and goal_progress_latest change on any write, including a message
+# filled in later. Timestamps would not do, as CURRENT_TIMESTAMP is the transaction start, so a
+# batch that commits after a later update could leave the version unchanged.
+CLIENTS_VERSION_SQL = text("SELECT count(*), max(id) FROM clients")
+CLIENT_GOALS_VERSION_SQL = text("""
+    SELECT count(g.id), max(g.id), sum(l.history_count),
+           md5(string_agg(g.xmin::text || ':' || COALESCE(l.xmin::text, ''), ',' ORDER BY g.id))
+    FROM goals g
+    LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+    WHERE g.client_id = :client_id
+""")
+
+def _data_version(conn, sql, params):
+    return tuple(conn.execute(sql, params).one())
+
+async def _cached_json(request, scope, variant, version_sql, version_params, fetch):
+    """
+    Serve a JSON read through the response cache: 304 when the client's ETag matches the current
+    data version, the cached body when present, otherwise await fetch() and cache its result.
+    The version is read before fetching, so a body cached under an ETag is never older than it.
+    """
+    data_version = await run_db(_data_version, version_sql, version_params)
+    etag = response_cache.etag(scope, data_version, variant)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response_cache.not_modified(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(etag)
+    if body is None:
+        body = json.dumps(await fetch(), default=str).encode("utf-8")
+        response_cache.set(etag, body)
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/clients")
-def get_clients():
-    engine = create_engine(DATABASE_URL)
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT id, client_name FROM clients ORDER BY client_name"))
-        clients = [dict(row._mapping) for row in result]
-    return convert_decimals(clients)
+async def get_clients(request: Request):
+    async def fetch():
+        return convert_decimals(await run_db(_fetch_clients))
+    return await _cached_json(request, CLIENTS_SCOPE, "", CLIENTS_VERSION_SQL, {}, fetch)
+
+# One round trip per client: goals plus their history aggregated as JSON in Postgres,
+# with numerics cast to float8 so nothing needs converting in Python.
+GOALS_WITH_HISTORY_SQL = text("""
+    SELECT g.id,
+           g.goal_type,
+           g.goal_amount::float8 AS goal_amount,
+           g.initial_amount::float8 AS initial_amount,
+           g.current_amount::float8 AS current_amount,
+           g.monthly_contribution::float8 AS monthly_contribution,
+           g.withdrawal_period_months,
+           g.expected_return_rate::float8 AS expected_return_rate,
+           l.progress_percent::float8 AS progress_percent,
+           l.change_direction,
+           COALESCE(h.history, '[]'::json) AS history,
+           h.last_created_at,
+           h.last_id
+    FROM goals g
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'goal_amount', p.goal_amount::float8,
+                   'current_amount', p.current_amount::float8,
+                   'last_message_sent', p.last_message_sent,
+                   'created_at', p.created_at
+               ) ORDER BY p.created_at, p.id) AS history,
+               max(p.created_at) AS last_created_at,
+               (array_agg(p.id ORDER BY p.created_at DESC, p.id DESC))[1] AS last_id
+        FROM (
+            SELECT id, goal_amount, current_amount, last_message_sent, created_at
+            FROM goal_history
+            WHERE goal_id = g.id
+              -- Keyset cursor in page order; with no since_id the NULL makes this created_at > since
+              AND (CAST(:since AS timestamp) IS NULL
+                   OR (created_at, id) > (CAST(:since AS timestamp), CAST(:since_id AS integer)))
+            ORDER BY created_at, id
+            LIMIT CAST(:limit AS integer)
+        ) p
+    ) h ON TRUE
+    LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+    WHERE g.client_id = :client_id
+      AND (CAST(:goal_id AS integer) IS NULL OR g.id = CAST(:goal_id AS integer))
+    ORDER BY g.goal_type
+""")
+
+def _goal_from_row(row, limit):
+    goal = dict(row._mapping)
+    last_created_at = goal.pop("last_created_at")
+    last_id = goal.pop("last_id")
+    if isinstance(goal["history"], str):
+        # asyncpg hands json columns back undecoded
+        goal["history"] = json.loads(goal["history"])
+    goal["on_track"] = is_goal_on_track(
+        goal["current_amount"],
+        goal["monthly_contribution"],
+        goal["withdrawal_period_months"],
+        goal["expected_return_rate"],
+        goal["goal_amount"]
+    )
+    # Cursor for the next page of this goal's history, if the page was full; pass it back with
+    # goal_id, since each goal pages on its own
+    full_page = limit is not None and len(goal["history"]) >= limit
+    has_cursor = full_page and last_created_at is not None
+    goal["history_next_since"] = last_created_at.isoformat() if has_cursor else None
+    goal["history_next_since_id"] = last_id if has_cursor else None
+    return goal
+
+def _goal_history_params(client_id, goal_id, since, since_id, limit):
+    return {"client_id": client_id, "goal_id": goal_id, "since": since, "since_id": since_id, "limit": limit}
+
+def _fetch_goals_with_history(conn, params):
+    result = conn.execute(GOALS_WITH_HISTORY_SQL, params)
+    return [_goal_from_row(row, params["limit"]) for row in result]
+
+async def _stream_goals_with_history(params):
+    # NDJSON, one goal per line, read through a server-side cursor
+    async for row in stream_rows(GOALS_WITH_HISTORY_SQL, params):
+        yield json.dumps(_goal_from_row(row, params["limit"]), default=str) + "\n"
 
 @app.get("/clients/{client_id}/all-goal-history")
-def get_all_goal_history(client_id: int):
-    def is_goal_on_track(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount):
-        r = expected_return_rate / 12
-        n = withdrawal_period_months
-        P = current_amount
-        PMT = monthly_contribution
-        if r == 0:
-            future_value = P + PMT * n
-        else:
-            future_value = P * (1 + r) ** n + PMT * (((1 + r) ** n - 1) / r)
-        return future_value >= goal_amount
-
-    engine = create_engine(DATABASE_URL)
-    with engine.connect() as conn:
-        # Get all goals for the client, including new fields
-        goals_result = conn.execute(text("""
-            SELECT id, goal_type, goal_amount, initial_amount, current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate
-            FROM goals
-            WHERE client_id = :client_id
-            ORDER BY goal_type
-        """), {"client_id": client_id})
-        goals = [dict(row._mapping) for row in goals_result]
-        # For each goal, get its history and calculate on_track
-        for goal in goals:
-            history_result = conn.execute(text("""
-                SELECT goal_amount, current_amount, last_message_sent, created_at
-                FROM goal_history
-                WHERE goal_id = :goal_id
-                ORDER BY created_at
-            """), {"goal_id": goal["id"]})
-            goal["history"] = [dict(row._mapping) for row in history_result]
-            goal["on_track"] = is_goal_on_track(
-                goal["current_amount"],
-                goal["monthly_contribution"],
-                goal["withdrawal_period_months"],
-                goal["expected_return_rate"],
-                goal["goal_amount"]
-            )
+async def get_all_goal_history(
+    request: Request,
+    client_id: int,
+    goal_id: Optional[int] = Query(None, description="Only return this goal."),
+    since: Optional[datetime] = Query(None, description="Only return history created after this timestamp, or with since_id, after this entry."),
+    since_id: Optional[int] = Query(None, description="With since and goal_id: a goal's history_next_since_id, to fetch its next page."),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max history entries per goal."),
+    stream: bool = Query(False, description="Stream goals as NDJSON instead of a single JSON array."),
+):
+    if since_id is not None and (since is None or goal_id is None):
+        # A page cursor belongs to one goal; applied to every goal it would skip their older rows
+        raise HTTPException(status_code=422, detail="since_id needs since and goal_id.")
+    params = _goal_history_params(client_id, goal_id, since, since_id, limit)
+    if stream:
+        return StreamingResponse(_stream_goals_with_history(params), media_type="application/x-ndjson")
+
+    async def fetch():
+        goals = await run_db(_fetch_goals_with_history, params)
+        if not goals:
+            raise HTTPException(status_code=404, detail="No goals found for this client.")
+        return goals
+    return await _cached_json(
+        request, client_scope(client_id), f"{goal_id}|{since}|{since_id}|{limit}",
+        CLIENT_GOALS_VERSION_SQL, {"client_id": client_id}, fetch,
+    )
+
+def _fetch_portfolio_goals(conn, client_id):
+    result = conn.execute(text("""
+        SELECT g.id AS goal_id,
+               g.client_id,
+               c.client_name,
+               g.goal_type,
+               g.goal_amount::float8 AS goal_amount,
+               g.current_amount::float8 AS current_amount,
+               g.monthly_contribution::float8 AS monthly_contribution,
+               g.withdrawal_period_months,
+               g.expected_return_rate::float8 AS expected_return_rate
+        FROM goals g
+        JOIN clients c ON g.client_id = c.id
+        WHERE CAST(:client_id AS integer) IS NULL OR g.client_id = CAST(:client_id AS integer)
+        ORDER BY g.id
+    """), {"client_id": client_id})
+    return [dict(row._mapping) for row in result]
+
+@app.get("/portfolio/projections")
+async def get_portfolio_projections(
+    client_id: Optional[int] = Query(None, description="Restrict to one client's goals."),
+    off_track_only: bool = Query(False),
+    curve_months: int = Query(0, ge=0, le=600, description="Include a month-by-month projection curve this many months out."),
+):
+    goals = await run_db(_fetch_portfolio_goals, client_id)
     if not goals:
-        raise HTTPException(status_code=404, detail="No goals found for this client.")
-    return convert_decimals(goals)
+        return {"count": 0, "off_track_count": 0, "goals": []}
+    projections = project_goals(
+        [g["current_amount"] for g in goals],
+        [g["monthly_contribution"] or 0 for g in goals],
+        [g["withdrawal_period_months"] or 0 for g in goals],
+        [g["expected_return_rate"] or 0 for g in goals],
+        [g["goal_amount"] for g in goals],
+    )
+    curves = None
+    if curve_months:
+        curves = projection_curves(
+            [g["current_amount"] for g in goals],
+            [g["monthly_contribution"] or 0 for g in goals],
+            [g["expected_return_rate"] or 0 for g in goals],
+            curve_months,
+        ).round(2).tolist()
+    future_value = projections["future_value"].round(2).tolist()
+    on_track = projections["on_track"].tolist()
+    shortfall = projections["shortfall"].round(2).tolist()
+    required = projections["required_monthly_contribution"].round(2).tolist()
+    results = []
+    for i, goal in enumerate(goals):
+        if off_track_only and on_track[i]:
+            continue
+        goal["projected_value"] = future_value[i]
+        goal["on_track"] = on_track[i]
+        goal["projected_shortfall"] = shortfall[i]
+        goal["required_monthly_contribution"] = required[i]
+        if curves is not None:
+            goal["projection_curve"] = curves[i]
+        results.append(goal)
+    return {
+        "count": len(goals),
+        "off_track_count": on_track.count(False),
+        "goals": results,
+    }
 
 class UpdateGoalAmountRequest(BaseModel):
     client_id: int
     goal_id: int
     current_amount: float
     send_sms: bool = False  # Optional parameter, default False
+    # Return as soon as the balance is written and fill in the message afterwards
+    async_message: bool = False
+
+def _read_goal_for_update(conn, req):
+    # 1. Validate goal and client; also fetch the latest message so it isn't repeated
+    goal_result = conn.execute(text("""
+        SELECT g.id, g.goal_amount, g.current_amount, g.goal_type, g.client_id, c.client_name, l.last_message_sent
+        FROM goals g
+        JOIN clients c ON g.client_id = c.id
+        LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+        WHERE g.id = :goal_id AND g.client_id = :client_id
+    """), {"goal_id": req.goal_id, "client_id": req.client_id})
+    return goal_result.fetchone()
+
+def _write_goal_update(conn, req, goal_amount, message):
+    # 3. Update the goal's current_amount
+    conn.execute(text("UPDATE goals SET current_amount = :current_amount WHERE id = :goal_id"), {"current_amount": req.current_amount, "goal_id": req.goal_id})
+    # 4. Insert into goal_history with the generated message
+    result = conn.execute(text("""
+        INSERT INTO goal_history (goal_id, goal_amount, current_amount, last_message_sent, created_at)
+        VALUES (:goal_id, :goal_amount, :current_amount, :last_message_sent, NOW())
+        RETURNING id
+    """), {
+        "goal_id": req.goal_id,
+        "goal_amount": goal_amount,
+        "current_amount": req.current_amount,
+        "last_message_sent": message
+    })
+    return result.scalar_one()
+
+def _fill_history_message(conn, history_id, message):
+    conn.execute(text("UPDATE goal_history SET last_message_sent = :message WHERE id = :history_id"), {"message": message, "history_id": history_id})
+
+async def generate_message_off_loop(client_dict, progress_percent, progress_change):
+    """
+    A pooled message straight from memory; otherwise run the blocking LLM call in a worker thread
+    with a deadline, and templates cover timeouts.
+    """
+    pooled = pooled_message(client_dict, progress_percent, progress_change)
+    if pooled:
+        return pooled
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(generate_message, client_dict, progress_percent, progress_change, False),
+            timeout=MESSAGE_LLM_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        return template_fallback(client_dict, progress_percent, progress_change, "timeout")
+
+def _goal_changed(client_id, goal_id):
+    # Cached chat answers for this client are now stale; goal history ETags follow the data on their own
+    invalidate_goal(client_id, goal_id)
+
+async def _after_goal_write(background_tasks, req, message):
+    _goal_changed(req.client_id, req.goal_id)
+    # Keep the RAG index fresh for this goal once the write has committed
+    background_tasks.add_task(sync_goals_quietly, [req.goal_id])
+    if req.send_sms:
+        # Only this client's numbers hear about their goal
+        numbers = await asyncio.to_thread(recipient_registry.numbers_for_client, req.client_id)
+        job = await asyncio.to_thread(dispatcher.submit, numbers, message)
+        return job.to_dict(include_results=False)
+    return None
+
+async def _complete_goal_update(req, history_id, client_dict, progress_percent, progress_change):
+    message = await generate_message_off_loop(client_dict, progress_percent, progress_change)
+    await run_db(_fill_history_message, history_id, message, transaction=True)
+    _goal_changed(req.client_id, req.goal_id)
+    await asyncio.to_thread(sync_goals_quietly, [req.goal_id])
+    if req.send_sms:
+        numbers = await asyncio.to_thread(recipient_registry.numbers_for_client, req.client_id)
+        await asyncio.to_thread(dispatcher.submit, numbers, message)
 
 @app.post("/update-goal-amount")
-async def update_goal_amount(req: UpdateGoalAmountRequest):
-    engine = create_engine(DATABASE_URL)
-    with engine.begin() as conn:
-        # 1. Validate goal and client
-        goal_result = conn.execute(text("""
-            SELECT g.id, g.goal_amount, g.current_amount, g.goal_type, g.client_id, c.client_name
-            FROM goals g
-            JOIN clients c ON g.client_id = c.id
-            WHERE g.id = :goal_id AND g.client_id = :client_id
-        """), {"goal_id": req.goal_id, "client_id": req.client_id})
-        goal = goal_result.fetchone()
-        if not goal:
-            raise HTTPException(status_code=404, detail="Goal not found for this client.")
-        # 2. Calculate progress and change
-        progress_percent = calculate_progress_percent(req.current_amount, float(goal.goal_amount))
-        progress_change = detect_progress_change(float(req.current_amount), float(goal.current_amount))
-        client_dict = {
-            "client_name": goal.client_name,
-            "goal_type": goal.goal_type,
-            "goal_amount": float(goal.goal_amount),
-            "current_value": float(req.current_amount),
-            "last_month_value": float(goal.current_amount),
-            "last_message_sent": None
+async def update_goal_amount(req: UpdateGoalAmountRequest, background_tasks: BackgroundTasks):
+    # Phase 1: read and compute, outside any write transaction
+    goal = await run_db(_read_goal_for_update, req)
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found for this client.")
+    # 2. Calculate progress and change
+    progress_percent = calculate_progress_percent(req.current_amount, float(goal.goal_amount))
+    progress_change = detect_progress_change(float(req.current_amount), float(goal.current_amount))
+    client_dict = {
+        "client_name": goal.client_name,
+        "goal_type": goal.goal_type,
+        "goal_amount": float(goal.goal_amount),
+        "current_value": float(req.current_amount),
+        "last_month_value": float(goal.current_amount),
+        "last_message_sent": goal.last_message_sent
+    }
+    if req.async_message:
+        # Phase 3 first: write the balance now, the message lands in goal_history later
+        history_id = await run_db(_write_goal_update, req, goal.goal_amount, None, transaction=True)
+        _goal_changed(req.client_id, req.goal_id)
+        background_tasks.add_task(_complete_goal_update, req, history_id, client_dict, progress_percent, progress_change)
+        return {
+            "message": "Goal updated; motivational message is being generated.",
+            "motivational_message": None,
+            "history_id": history_id,
+            "sms_job": None
         }
-        message = generate_message(client_dict, progress_percent, progress_change)
-        # 3. Update the goal's current_amount
-        conn.execute(text("UPDATE goals SET current_amount = :current_amount WHERE id = :goal_id"), {"current_amount": req.current_amount, "goal_id": req.goal_id})
-        # 4. Insert into goal_history with the generated message
-        conn.execute(text("""
-            INSERT INTO goal_history (goal_id, goal_amount, current_amount, last_message_sent, created_at)
-            VALUES (:goal_id, :goal_amount, :current_amount, :last_message_sent, NOW())
-        """), {
-            "goal_id": req.goal_id,
-            "goal_amount": goal.goal_amount,
-            "current_amount": req.current_amount,
-            "last_message_sent": message
-        })
-    sms_results = []
-    if req.send_sms:
-        numbers = phone_numbers_cache.get("numbers", [])
-        for num in numbers:
-            try:
-                sid = send_sms(num, message)
-                sms_results.append({"number": num, "status": "sent", "sid": sid})
-            except Exception as e:
-                sms_results.append({"number": num, "status": "failed", "error": str(e)})
+    # Phase 2: generate the message with no connection checked out and no rows locked
+    message = await generate_message_off_loop(client_dict, progress_percent, progress_change)
+    # Phase 3: short write transaction
+    history_id = await run_db(_write_goal_update, req, goal.goal_amount, message, transaction=True)
+    sms_job = await _after_goal_write(background_tasks, req, message)
     return {
         "message": "Goal updated and history entry created.",
         "motivational_message": message,
-        "sms_results": sms_results if req.send_sms else None
+        "history_id": history_id,
+        "sms_job": sms_job
     }
 
+async def _iter_body_lines(request):
+    # Split the streamed request body into text lines without buffering the whole upload. The
+    # incremental decoder carries a character split across chunks over to the next one; bytes that
+    # aren't UTF-8 become U+FFFD and fail that row's validation instead of the whole request.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+@app.post("/goals/bulk-import")
+async def bulk_import_goals(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Body format: CSV with a header row, or NDJSON."),
+    errors_only: bool = Query(False, description="Only list rows that failed."),
+):
+    """
+    Stream a custodian balance file (client_id, goal_id, current_amount per row) in the request body.
+    """
+    parser = RowParser(format)
+    importer = BulkImporter()
+    batch = []
+    try:
+        async for line in _iter_body_lines(request):
+            try:
+                raw = parser.feed(line)
+            except ValueError as e:
+                raw = {"_error": str(e)}
+            if raw is None:
+                continue
+            batch.append(raw)
+            if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+                await asyncio.to_thread(importer.process_batch, batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(importer.process_batch, batch)
+    finally:
+        importer.close()
+    for goal_id, client_id in importer.updated_goal_ids.items():
+        _goal_changed(client_id, goal_id)
+    if importer.updated_goal_ids:
+        background_tasks.add_task(sync_goals_quietly, list(importer.updated_goal_ids))
+    return importer.summary(errors_only=errors_only)
+
 class ChatRequest(BaseModel):
     messages: list
+    # Lets the rolling history summary be reused across turns of one conversation
+    session_id: Optional[str] = None
+    # Restrict retrieval (and SQL-routed answers) to one client's or one goal's data; otherwise the
+    # clients named in the question are used
+    client_id: Optional[int] = None
+    goal_id: Optional[int] = None
+
+def _explicit_scope(req):
+    if req.client_id is not None or req.goal_id is not None:
+        return {"client_id": req.client_id, "goal_id": req.goal_id}
+    return None
+
+def _chat_scope(req):
+    """
+    Retrieval scope for a chat request: explicit ids win, then the clients named in the latest
+    message. None means the whole book, also when a named first name is ambiguous.
+    """
+    scope = _explicit_scope(req)
+    if scope:
+        return scope
+    clients = find_clients(None, req.messages[-1]["content"]) if req.messages else None
+    if not clients:
+        return None
+    if len(clients) == 1:
+        return {"client_id": clients[0][0], "goal_id": None}
+    return {"client_ids": sorted(client_id for client_id, _ in clients), "goal_id": None}
 
 @app.post("/api/ai-chat")
 def ai_chat(req: ChatRequest):
-    answer, sources = langchain_ai_chat(req.messages)
-    print("[LANGCHAIN RAG SOURCES]:", sources)
-    return {"reply": answer}
+    started = time.perf_counter()
+    # Aggregate and lookup questions are answered straight from SQL
+    routed = route_question(req.messages[-1]["content"], _explicit_scope(req), len(req.messages) > 1) if req.messages else None
+    if routed:
+        intent, answer = routed
+        router_stats.record(intent, time.perf_counter() - started)
+        return {"reply": answer}
+    scope = _chat_scope(req)
+    answer, sources, usage = langchain_ai_chat(req.messages, req.session_id, scope)
+    router_stats.record("rag", time.perf_counter() - started)
+    log_event("rag_sources", scope=scope, sources=_source_metadata(sources))
+    return {"reply": answer, "usage": usage, "scope": scope}
 
-# Local cache for phone numbers
-phone_numbers_cache = {}
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _source_metadata(sources):
+    return [
+        {"goal_id": doc.metadata.get("goal_id"), "client_id": doc.metadata.get("client_id")}
+        for doc in sources
+    ]
+
+@app.post("/api/ai-chat/stream")
+async def ai_chat_stream(req: ChatRequest, request: Request):
+    """
+    Server-Sent Events: one `token` event per answer token, then `sources`, then `done`.
+    """
+    async def events():
+        started = time.perf_counter()
+        first_token_at = None
+        routed = (await asyncio.to_thread(route_question, req.messages[-1]["content"], _explicit_scope(req), len(req.messages) > 1)
+                  if req.messages else None)
+        if routed:
+            intent, answer = routed
+            router_stats.record(intent, time.perf_counter() - started)
+            yield _sse("token", {"token": answer})
+            yield _sse("sources", [])
+            yield _sse("done", {"path": intent})
+            return
+        scope = await asyncio.to_thread(_chat_scope, req)
+        stream = langchain_ai_chat_stream(req.messages, req.session_id, scope)
+        try:
+            async for kind, payload in stream:
+                if await request.is_disconnected():
+                    # Closing the stream cancels the upstream LLM call
+                    break
+                if kind == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield _sse("token", {"token": payload})
+                elif kind == "usage":
+                    yield _sse("usage", payload)
+                else:
+                    yield _sse("sources", _source_metadata(payload))
+            else:
+                router_stats.record("rag", time.perf_counter() - started)
+                ttft_ms = round((first_token_at - started) * 1000, 1) if first_token_at else None
+                yield _sse("done", {"path": "rag", "scope": scope, "time_to_first_token_ms": ttft_ms})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/ai-chat/routing-stats")
+def ai_chat_routing_stats():
+    return router_stats.snapshot()
+
+@app.get("/api/ai-chat/cache-stats")
+def ai_chat_cache_stats():
+    return cache_stats()
+
+@app.get("/message-pool/stats")
+def message_pool_stats():
+    return message_pool.stats()
+
+@app.get("/response-cache/stats")
+def response_cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus scrape endpoint: stage latency histograms, LLM tokens, template fallbacks and SMS results.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 class PhoneNumbersRequest(BaseModel):
     numbers: list[str] = Field(
         ..., 
         example=["+1234567890", "+1987654321", "+1123456789"]
     )
+    # Client the numbers belong to; omitted means the advisor's general list
+    client_id: Optional[int] = None
+    # Replace that owner's numbers (the default) instead of adding to them
+    replace: bool = True
 
 @app.post("/phone-numbers")
 def store_phone_numbers(req: PhoneNumbersRequest):
-    # Store the numbers in a global cache, override previous
-    phone_numbers_cache["numbers"] = req.numbers
-    return {"message": "Phone numbers stored.", "count": len(req.numbers)}
+    # Stored in Postgres, so every worker sees the same numbers and they survive restarts
+    try:
+        numbers = recipient_registry.register(req.numbers, req.client_id, replace=req.replace)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"message": "Phone numbers stored.", "count": len(numbers), "client_id": req.client_id}
 
 @app.get("/phone-numbers")
-def get_phone_numbers():
-    # Return the current list of phone numbers
-    return {"numbers": phone_numbers_cache.get("numbers", [])}
+def get_phone_numbers(client_id: Optional[int] = Query(None, description="Numbers of this client instead of the general list.")):
+    if client_id is None:
+        return {"numbers": recipient_registry.unassigned_numbers()}
+    return {"client_id": client_id, "numbers": recipient_registry.numbers_for_client(client_id)}
+
+@app.post("/phone-numbers/import")
+async def import_phone_numbers(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Body format: CSV with a header row, or NDJSON."),
+):
+    """
+    Stream phone_number[, client_id] rows in the request body and upsert them in batches.
+    """
+    parser = RowParser(format)
+    importer = RecipientImporter(recipient_registry)
+    batch = []
+    async for line in _iter_body_lines(request):
+        try:
+            raw = parser.feed(line)
+        except ValueError as e:
+            raw = {"_error": str(e)}
+        if raw is None:
+            continue
+        batch.append(raw)
+        if len(batch) >= RECIPIENT_IMPORT_BATCH_SIZE:
+            await asyncio.to_thread(importer.process_batch, batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(importer.process_batch, batch)
+    return importer.summary()
 
 class BulkSMSRequest(BaseModel):
     message: str = Field(..., example="This is a test message from HALO!")
+    # Send to this client's numbers instead of the general list
+    client_id: Optional[int] = None
 
 @app.post("/send-bulk-sms")
 def send_bulk_sms(req: BulkSMSRequest):
-    numbers = phone_numbers_cache.get("numbers", [])
+    if req.client_id is None:
+        numbers = recipient_registry.unassigned_numbers()
+    else:
+        numbers = recipient_registry.numbers_for_client(req.client_id)
     if not numbers:
         return {"error": "No phone numbers stored. Please add numbers first."}
-    sms_results = []
-    for num in numbers:
-        try:
-            sid = send_sms(num, req.message)
-            sms_results.append({"number": num, "status": "sent", "sid": sid})
-        except Exception as e:
-            sms_results.append({"number": num, "status": "failed", "error": str(e)})
-    return {"message": "Bulk SMS send attempt complete.", "results": sms_results} 
\ No newline at end of file
+    # Sends run in the background; poll /sms-jobs/{job_id} for progress
+    job = dispatcher.submit(numbers, req.message)
+    return {"message": "Bulk SMS job queued.", "job_id": job.id, "status_url": f"/sms-jobs/{job.id}"}
+
+@app.get("/sms-jobs/{job_id}")
+def get_sms_job(job_id: str):
+    # Any worker can answer: jobs queued elsewhere are read from Postgres
+    job = dispatcher.status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="SMS job not found.")
+    return job
\ No newline at end of file
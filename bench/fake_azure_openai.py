@@ -0,0 +1,150 @@
+"""
+Local stand-in for Azure OpenAI chat completions (streaming and not) and embeddings.
+
+    python bench/fake_azure_openai.py --port 8082 --latency-ms 300 --token-delay-ms 20
+    AZURE_OPENAI_ENDPOINT=http://localhost:8082 AZURE_OPENAI_KEY=fake \\
+    AZURE_OPENAI_DEPLOYMENT=chat AZURE_OPENAI_EMBEDDING_DEPLOYMENT=embed uvicorn api:app
+
+Embeddings are deterministic per input text, so retrieval behaves consistently run to run.
+"""
+import re
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEPLOYMENT_PATH = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/(?P<operation>chat/completions|embeddings)")
+
+DEFAULT_REPLY = (
+    "Based on the latest history, the client is making steady progress toward their goal. "
+    "Keeping monthly contributions consistent should keep them on track."
+)
+
+
+def fake_embedding(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeAzureOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 0.0
+    token_delay_ms = 0.0
+    dim = 1536
+    reply = DEFAULT_REPLY
+    stats = {"chat": 0, "embeddings": 0, "embedded_inputs": 0, "cancelled": 0}
+    stats_lock = threading.Lock()
+
+    def do_POST(self):
+        match = DEPLOYMENT_PATH.match(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not match:
+            return self._json(404, {"error": {"code": "404", "message": "Resource not found"}})
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if match.group("operation") == "embeddings":
+            return self._embeddings(payload)
+        return self._chat(payload, match.group("deployment"))
+
+    def _embeddings(self, payload):
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with self.stats_lock:
+            self.stats["embeddings"] += 1
+            self.stats["embedded_inputs"] += len(inputs)
+        self._json(200, {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, self.dim)} for i, text in enumerate(inputs)],
+            "model": "text-embedding-ada-002",
+            "usage": {"prompt_tokens": sum(len(t.split()) for t in inputs), "total_tokens": sum(len(t.split()) for t in inputs)},
+        })
+
+    def _chat(self, payload, deployment):
+        with self.stats_lock:
+            self.stats["chat"] += 1
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in payload.get("messages", []))
+        # Keep tokens as words plus their trailing space, like a real tokenizer stream
+        tokens = re.findall(r"\S+\s*", self.reply)
+        completion_id = "chatcmpl-" + uuid.uuid4().hex
+        if not payload.get("stream"):
+            return self._json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": self.reply}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+            })
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._chunk({"id": completion_id, "object": "chat.completion.chunk", "model": deployment,
+                         "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
+            for token in tokens:
+                if self.token_delay_ms:
+                    time.sleep(self.token_delay_ms / 1000)
+                self._chunk({"id": completion_id, "object": "chat.completion.chunk", "model": deployment,
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self._chunk({"id": completion_id, "object": "chat.completion.chunk", "model": deployment,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled mid-stream
+            with self.stats_lock:
+                self.stats["cancelled"] += 1
+
+    def _chunk(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_fake_azure_openai(port=0, latency_ms=0.0, token_delay_ms=0.0, dim=1536, reply=DEFAULT_REPLY):
+    handler = type("ConfiguredFakeAzureOpenAIHandler", (FakeAzureOpenAIHandler,), {
+        "latency_ms": latency_ms, "token_delay_ms": token_delay_ms, "dim": dim, "reply": reply,
+        "stats": {"chat": 0, "embeddings": 0, "embedded_inputs": 0, "cancelled": 0}, "stats_lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def start_fake_azure_openai(port=0, latency_ms=0.0, token_delay_ms=0.0, dim=1536, reply=DEFAULT_REPLY):
+    """
+    Start the fake in a daemon thread; returns the server (base URL from server.server_address).
+    """
+    server = make_fake_azure_openai(port, latency_ms, token_delay_ms, dim, reply)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before the first byte of every response")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Delay between streamed tokens")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    args = parser.parse_args()
+    print(f"Fake Azure OpenAI listening on http://127.0.0.1:{args.port}")
+    make_fake_azure_openai(args.port, args.latency_ms, args.token_delay_ms, args.dim).serve_forever()
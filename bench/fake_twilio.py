@@ -0,0 +1,86 @@
+"""
+Local stand-in for the Twilio Messages API, for exercising the SMS dispatcher
+without sending real texts.
+
+    python bench/fake_twilio.py --port 8081 --latency-ms 150 --fail-rate 0.05
+    TWILIO_API_BASE_URL=http://localhost:8081 uvicorn api:app
+
+Failures are returned as 503s so the dispatcher's retry path is exercised.
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/(?P<account_sid>[^/]+)/Messages\.json$")
+
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    fail_rate = 0.0
+    sent = []
+    sent_lock = threading.Lock()
+
+    def do_POST(self):
+        match = MESSAGES_PATH.match(self.path)
+        if not match:
+            return self._reply(404, {"code": 20404, "message": "Not found", "status": 404})
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if random.random() < self.fail_rate:
+            return self._reply(503, {"code": 20503, "message": "Service unavailable", "status": 503})
+        sid = "SM" + uuid.uuid4().hex
+        with self.sent_lock:
+            self.sent.append({"sid": sid, "to": form.get("To"), "body": form.get("Body")})
+        self._reply(201, {
+            "sid": sid,
+            "account_sid": match.group("account_sid"),
+            "to": form.get("To"),
+            "body": form.get("Body"),
+            "messaging_service_sid": form.get("MessagingServiceSid"),
+            "status": "queued",
+        })
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_fake_twilio(port=0, latency_ms=0.0, fail_rate=0.0):
+    handler = type("ConfiguredFakeTwilioHandler", (FakeTwilioHandler,), {
+        "latency_ms": latency_ms, "fail_rate": fail_rate, "sent": [], "sent_lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def start_fake_twilio(port=0, latency_ms=0.0, fail_rate=0.0):
+    """
+    Start the fake in a daemon thread; returns the server (base URL from server.server_address).
+    """
+    server = make_fake_twilio(port, latency_ms, fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(f"Fake Twilio listening on http://127.0.0.1:{args.port}")
+    make_fake_twilio(args.port, args.latency_ms, args.fail_rate).serve_forever()
@@ -0,0 +1,279 @@
+"""
+End-to-end load benchmark: starts the API against local fake Azure OpenAI and Twilio servers,
+drives each endpoint at fixed concurrency levels and reports throughput and p50/p95/p99 latency.
+
+    python bench/load_benchmark.py --seed --clients 2000 --months 36 --output results.json
+    python bench/load_benchmark.py --concurrency 1 8 32 --duration 15 --baseline results.json
+
+The database comes from the usual DB_* / DATABASE_URL settings. --seed adds a synthetic book
+(see seed_large_dataset.py) first. Note that /update-goal-amount writes real rows.
+With --baseline, each result gets its change against the matching entry of an earlier run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import httpx
+from sqlalchemy import text
+from fake_twilio import start_fake_twilio
+from fake_azure_openai import start_fake_azure_openai
+from seed_large_dataset import seed_book
+from startup_benchmark import REPO_ROOT, free_port, wait_for
+
+sys.path.insert(0, REPO_ROOT)
+from db import get_engine  # noqa: E402
+
+ALL_SCENARIOS = ["clients", "goal_history", "update_goal", "ai_chat", "bulk_sms"]
+SMS_RECIPIENTS = [f"+1555{n:07d}" for n in range(10)]
+CHAT_TEMPLATES = [
+    "Explain how {name}'s goals are progressing and what should change.",
+    "Suggest how {name} could reach their goals sooner.",
+    "Why might {name} be falling behind, and what would you recommend?",
+]
+
+
+def load_book(engine):
+    with engine.connect() as conn:
+        goals = [tuple(row) for row in conn.execute(text("""
+            SELECT g.id, g.client_id, g.current_amount::float8, c.client_name
+            FROM goals g JOIN clients c ON c.id = g.client_id
+        """))]
+    if not goals:
+        raise SystemExit("No goals in the database; run with --seed")
+    return goals
+
+
+def make_request(scenario, goals, rng):
+    """
+    (method, path, json body) for one request of the scenario against a random goal/client.
+    """
+    goal_id, client_id, current_amount, client_name = rng.choice(goals)
+    if scenario == "clients":
+        return "GET", "/clients", None
+    if scenario == "goal_history":
+        return "GET", f"/clients/{client_id}/all-goal-history?limit=24", None
+    if scenario == "update_goal":
+        amount = round(current_amount * rng.uniform(0.97, 1.05), 2)
+        return "POST", "/update-goal-amount", {"client_id": client_id, "goal_id": goal_id, "current_amount": amount}
+    if scenario == "ai_chat":
+        question = rng.choice(CHAT_TEMPLATES).format(name=client_name)
+        return "POST", "/api/ai-chat", {"messages": [{"role": "user", "content": question}]}
+    if scenario == "bulk_sms":
+        return "POST", "/send-bulk-sms", {"message": f"Benchmark message {rng.randrange(10**6)}"}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return round(sorted_values[index], 2)
+
+
+async def run_level(client, scenario, concurrency, duration, goals, seed_value):
+    """
+    Keep `concurrency` requests in flight for `duration` seconds; returns the latency summary.
+    """
+    rng = random.Random(f"{seed_value}-{scenario}-{concurrency}")
+    latencies, errors, responses = [], 0, []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, body = make_request(scenario, goals, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                response, ok = None, False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+            elif scenario == "bulk_sms":
+                responses.append(response.json().get("job_id"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+    }
+    if scenario == "bulk_sms":
+        result.update(await _wait_for_sms_jobs(client, [job_id for job_id in responses if job_id], started, max(30.0, duration * 5)))
+    return result
+
+
+async def _wait_for_sms_jobs(client, job_ids, started, timeout):
+    """
+    Delivery throughput for the queued jobs: sends only finish after the requests return.
+    """
+    sent = failed = 0
+    pending = list(job_ids)
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        job = (await client.get(f"/sms-jobs/{pending[0]}")).json()
+        if job.get("status") != "completed":
+            await asyncio.sleep(0.1)
+            continue
+        sent += job["sent"]
+        failed += job["failed"]
+        pending.pop(0)
+    elapsed = time.perf_counter() - started
+    return {
+        "sms_sent": sent,
+        "sms_failed": failed,
+        "sms_jobs_unfinished": len(pending),
+        "sms_per_second": round(sent / elapsed, 2) if elapsed else None,
+    }
+
+
+async def run_scenarios(base_url, scenarios, levels, duration, goals, seed_value, timeout, warmup):
+    limits = httpx.Limits(max_connections=max(levels) + 4, max_keepalive_connections=max(levels) + 4)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if "bulk_sms" in scenarios:
+            (await client.post("/phone-numbers", json={"numbers": SMS_RECIPIENTS})).raise_for_status()
+        for scenario in scenarios:
+            # Untimed requests first, so one-off costs (lazy imports, first connections) don't skew the numbers
+            rng = random.Random(seed_value)
+            for _ in range(warmup):
+                method, path, body = make_request(scenario, goals, rng)
+                await client.request(method, path, json=body)
+            for concurrency in levels:
+                result = await run_level(client, scenario, concurrency, duration, goals, seed_value)
+                print(f"{scenario:>13} c={concurrency:<4} {result['throughput_rps']:>9} rps  "
+                      f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}",
+                      file=sys.stderr)
+                results.append(result)
+    return results
+
+
+def compare(results, baseline):
+    """
+    Percent change of throughput and p95 per (scenario, concurrency) against an earlier run.
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if not before:
+            continue
+        for key in ("throughput_rps", "p95_ms"):
+            if before.get(key) and result.get(key) is not None:
+                result[f"{key}_change_pct"] = round((result[key] - before[key]) / before[key] * 100, 1)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(env, port, workers, timeout, work_dir):
+    # Run from work_dir so the Chroma store, embedding cache and sync watermark belong to this run
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--app-dir", REPO_ROOT, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    with httpx.Client(timeout=timeout) as client:
+        if not wait_for(client, base_url + "/readyz", timeout):
+            server.terminate()
+            raise SystemExit("API did not become ready")
+        # Chat numbers are only meaningful once the pipeline is built and the index synced
+        rag_synced = lambda r: (r.status_code == 200 and r.json()["subsystems"]["rag"]["status"] == "ready"
+                                and r.json()["subsystems"]["vector_sync"]["last_synced_at"] is not None)
+        if not wait_for(client, base_url + "/readyz?require_rag=true", timeout, rag_synced):
+            print("[WARN] RAG pipeline or vector sync not ready; ai_chat results will reflect that", file=sys.stderr)
+    return server, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=ALL_SCENARIOS, default=ALL_SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario and concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", action="store_true", help="Seed a synthetic book before running")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--goals-per-client", type=int, default=3)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=10.0)
+    parser.add_argument("--twilio-latency-ms", type=float, default=100.0)
+    parser.add_argument("--twilio-fail-rate", type=float, default=0.0)
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per scenario before measuring")
+    parser.add_argument("--sms-rate-per-sec", type=float, default=0.0, help="Dispatcher rate limit (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--work-dir", help="Directory for the server's Chroma store and caches (default: a fresh temp dir)")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    seeded = seed_book(engine, args.clients, args.goals_per_client, args.months, args.random_seed, purge_first=True) if args.seed else None
+    goals = load_book(engine)
+
+    fake_openai = start_fake_azure_openai(latency_ms=args.llm_latency_ms, token_delay_ms=args.token_delay_ms)
+    fake_twilio = start_fake_twilio(latency_ms=args.twilio_latency_ms, fail_rate=args.twilio_fail_rate)
+    env = dict(os.environ)
+    env.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{fake_openai.server_address[1]}",
+        "AZURE_OPENAI_KEY": "fake",
+        "AZURE_OPENAI_DEPLOYMENT": "chat",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "embed",
+        "TWILIO_API_BASE_URL": f"http://127.0.0.1:{fake_twilio.server_address[1]}",
+        "ACCOUNT_SID": "ACbenchmark",
+        "AUTH_TOKEN": "fake",
+        "MESSAGING_SERVICE_SID": "MGbenchmark",
+        "SMS_RATE_PER_SEC": str(args.sms_rate_per_sec),
+    })
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="load-benchmark-")
+    server, base_url = start_server(env, free_port(), args.workers, args.timeout, work_dir)
+    started_at = datetime.now(timezone.utc).isoformat()
+    try:
+        results = asyncio.run(run_scenarios(base_url, args.scenarios, args.concurrency, args.duration, goals, args.random_seed, args.timeout, args.warmup))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results = compare(results, json.load(f))
+    report = {
+        "started_at": started_at,
+        "git_commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "work_dir")},
+        "book": {"clients": len({g[1] for g in goals}), "goals": len(goals), "seeded": seeded},
+        "fake_upstreams": {"azure_openai": dict(fake_openai.RequestHandlerClass.stats), "twilio_messages": len(fake_twilio.RequestHandlerClass.sent)},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
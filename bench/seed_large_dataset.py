@@ -0,0 +1,186 @@
+"""
+Seed a large, deterministic book of clients, goals and monthly history, and time the history
+queries the API and vector sync depend on.
+
+    python bench/seed_large_dataset.py --clients 5000 --goals-per-client 3 --months 60
+    python bench/seed_large_dataset.py --benchmark-only > after.json
+
+Run the benchmark before and after `python migrate.py` to compare. Seeded clients are named
+"Seed Client N" and are added next to the existing data; --purge removes them first.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_engine  # noqa: E402
+
+SEED_PREFIX = "Seed Client "
+GOAL_TYPES = ["Retirement", "Home", "Education", "Emergency Fund", "Travel"]
+
+BENCHMARK_QUERIES = {
+    # What /clients/{id}/all-goal-history and the chunk builder read
+    "client_history": ("""
+        SELECT h.goal_id, h.goal_amount, h.current_amount, h.created_at
+        FROM goals g JOIN goal_history h ON h.goal_id = g.id
+        WHERE g.client_id = :client_id
+        ORDER BY h.goal_id, h.created_at, h.id
+    """, None),
+    # Latest message per goal, as read before every message generation
+    "latest_message_scan": ("""
+        SELECT g.id, (SELECT h.last_message_sent FROM goal_history h
+                      WHERE h.goal_id = g.id ORDER BY h.created_at DESC, h.id DESC LIMIT 1)
+        FROM goals g WHERE g.client_id = :client_id
+    """, None),
+    "latest_message_rollup": ("""
+        SELECT g.id, l.last_message_sent
+        FROM goals g LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+        WHERE g.client_id = :client_id
+    """, "goal_progress_latest"),
+    # Incremental vector sync: which goals changed in the last day
+    "changed_since_scan": ("""
+        SELECT DISTINCT goal_id FROM goal_history WHERE created_at >= now() - interval '1 day'
+    """, None),
+    "changed_since_rollup": ("""
+        SELECT goal_id FROM goal_progress_latest WHERE updated_at >= now() - interval '1 day'
+    """, "goal_progress_latest"),
+}
+
+
+def purge(conn):
+    seeded = "SELECT id FROM clients WHERE client_name LIKE :prefix"
+    params = {"prefix": SEED_PREFIX + "%"}
+    conn.execute(text(f"DELETE FROM goal_history WHERE goal_id IN (SELECT id FROM goals WHERE client_id IN ({seeded}))"), params)
+    conn.execute(text(f"DELETE FROM goals WHERE client_id IN ({seeded})"), params)
+    conn.execute(text("DELETE FROM clients WHERE client_name LIKE :prefix"), params)
+
+
+def _has_rollup(conn):
+    return conn.execute(text("SELECT to_regclass('goal_progress_latest') IS NOT NULL")).scalar()
+
+
+def seed(conn, clients, goals_per_client, months, seed_value):
+    """
+    Insert the book with set-based statements; returns row counts.
+    """
+    conn.execute(text("SELECT setseed(:seed)"), {"seed": (seed_value % 1000) / 1000})
+    first_client = conn.execute(text("SELECT COALESCE(max(id), 0) + 1 FROM clients")).scalar()
+    first_goal = conn.execute(text("SELECT COALESCE(max(id), 0) + 1 FROM goals")).scalar()
+    conn.execute(text("""
+        INSERT INTO clients (client_name, age)
+        SELECT :prefix || i, 25 + floor(random() * 40)::int FROM generate_series(1, :clients) AS i
+    """), {"prefix": SEED_PREFIX, "clients": clients})
+    conn.execute(text("""
+        INSERT INTO goals (client_id, goal_type, goal_amount, initial_amount, current_amount,
+                           monthly_contribution, withdrawal_period_months, expected_return_rate)
+        SELECT c.id, (CAST(:goal_types AS text[]))[1 + floor(random() * 5)::int],
+               target, target * 0.1, target * 0.1, round((target / 200)::numeric, 0), 24 + floor(random() * 96)::int, 0.04 + round((random() * 0.04)::numeric, 3)
+        FROM clients c
+        CROSS JOIN generate_series(1, :goals_per_client)
+        CROSS JOIN LATERAL (SELECT round((20000 + random() * 480000)::numeric, -3) AS target) t
+        WHERE c.id >= :first_client
+    """), {"goal_types": GOAL_TYPES, "goals_per_client": goals_per_client, "first_client": first_client})
+    # One entry per month ending this month, drifting upward with some down months
+    conn.execute(text("""
+        INSERT INTO goal_history (goal_id, goal_amount, current_amount, last_message_sent, created_at)
+        SELECT g.id, g.goal_amount, amount,
+               'Hi ' || split_part(c.client_name, ' ', 1) || ', you''re at ' || round(amount / g.goal_amount * 100) || '% of your '
+                   || lower(g.goal_type) || ' goal!',
+               date_trunc('month', now()) - make_interval(months => :months - m) + interval '9 hours'
+        FROM goals g
+        JOIN clients c ON c.id = g.client_id
+        CROSS JOIN generate_series(1, :months) AS m
+        CROSS JOIN LATERAL (
+            SELECT round(g.initial_amount + g.goal_amount * 0.9 * m / :months * (0.9 + random() * 0.2)::numeric, 2) AS amount
+        ) a
+        WHERE g.id >= :first_goal
+    """), {"months": months, "first_goal": first_goal})
+    conn.execute(text("""
+        UPDATE goals g SET current_amount = l.current_amount
+        FROM (SELECT DISTINCT ON (goal_id) goal_id, current_amount FROM goal_history
+              WHERE goal_id >= :first_goal ORDER BY goal_id, created_at DESC, id DESC) l
+        WHERE g.id = l.goal_id
+    """), {"first_goal": first_goal})
+    return {
+        "clients": clients,
+        "goals": clients * goals_per_client,
+        "history_rows": clients * goals_per_client * months,
+    }
+
+
+def seed_book(engine, clients, goals_per_client, months, seed_value=42, purge_first=False):
+    """
+    Seed in one transaction, rebuild the rollup and refresh planner statistics.
+    Returns {"seeded": row counts, "seed_seconds": elapsed}.
+    """
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        if purge_first:
+            purge(conn)
+        rollup = _has_rollup(conn)
+        if rollup:
+            # Per-row rollup upkeep is wasted on a bulk load; rebuild it once at the end instead
+            conn.execute(text("ALTER TABLE goal_history DISABLE TRIGGER goal_history_rollup"))
+        seeded = seed(conn, clients, goals_per_client, months, seed_value)
+        if rollup:
+            conn.execute(text("SELECT refresh_goal_progress_latest()"))
+            conn.execute(text("ALTER TABLE goal_history ENABLE TRIGGER goal_history_rollup"))
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+    return {"seeded": seeded, "seed_seconds": round(time.perf_counter() - started, 2)}
+
+
+def benchmark(engine, repeats, seed_value):
+    """
+    Median/p95 latency in ms for each query against random seeded clients.
+    """
+    rng = random.Random(seed_value)
+    results = {}
+    with engine.connect() as conn:
+        client_ids = [row.id for row in conn.execute(text("SELECT id FROM clients ORDER BY id"))]
+        has_rollup = _has_rollup(conn)
+        for name, (sql, requires) in BENCHMARK_QUERIES.items():
+            if requires and not has_rollup:
+                results[name] = None
+                continue
+            timings = []
+            for _ in range(repeats):
+                params = {"client_id": rng.choice(client_ids)} if ":client_id" in sql else {}
+                started = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                "median_ms": round(statistics.median(timings), 3),
+                "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--goals-per-client", type=int, default=3)
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--purge", action="store_true", help="Remove previously seeded clients first")
+    parser.add_argument("--benchmark-only", action="store_true", help="Skip seeding, just time the queries")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    report = {}
+    if not args.benchmark_only:
+        report.update(seed_book(engine, args.clients, args.goals_per_client, args.months, args.seed, args.purge))
+    with engine.connect() as conn:
+        report["totals"] = dict(conn.execute(text("""
+            SELECT (SELECT count(*) FROM clients) AS clients, (SELECT count(*) FROM goals) AS goals,
+                   (SELECT count(*) FROM goal_history) AS history_rows
+        """)).fetchone()._mapping)
+    report["queries"] = benchmark(engine, args.repeats, args.seed)
+    print(json.dumps(report, indent=2))
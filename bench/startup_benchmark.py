@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark: how long `import api` takes, how soon a fresh server answers
+/healthz and /readyz, and the latency of the first /clients and /api/ai-chat requests.
+
+    python bench/startup_benchmark.py --runs 3 > startup.json
+
+The database comes from the usual DB_* / DATABASE_URL settings. Azure OpenAI is replaced
+by bench/fake_azure_openai.py unless --real-openai is given, so numbers measure startup, not the LLM.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import httpx
+from fake_azure_openai import start_fake_azure_openai
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import api; print(time.perf_counter() - t)"
+CHAT_QUESTION = "Explain what would help my clients reach their retirement goals sooner."
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(client, url, timeout, ok=lambda r: r.status_code == 200):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if ok(client.get(url)):
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_import(env):
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_server(env, timeout):
+    """
+    Start uvicorn and time each milestone from process launch, in seconds.
+    """
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(port)],
+                              cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            if not wait_for(client, base + "/healthz", timeout):
+                raise RuntimeError("server did not become live")
+            result["healthz_s"] = time.perf_counter() - started
+            if wait_for(client, base + "/readyz", timeout):
+                result["readyz_s"] = time.perf_counter() - started
+
+            request_started = time.perf_counter()
+            client.get(base + "/clients").raise_for_status()
+            result["first_clients_request_s"] = time.perf_counter() - request_started
+
+            request_started = time.perf_counter()
+            client.post(base + "/api/ai-chat", json={"messages": [{"role": "user", "content": CHAT_QUESTION}]}).raise_for_status()
+            result["first_chat_request_s"] = time.perf_counter() - request_started
+
+            rag_ready = lambda r: r.status_code == 200 and r.json()["subsystems"]["rag"]["status"] == "ready"
+            if wait_for(client, base + "/readyz?require_rag=true", timeout, rag_ready):
+                result["rag_ready_s"] = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return result
+
+
+def _summarize(samples):
+    return {
+        "runs": len(samples),
+        "median": round(statistics.median(samples), 4),
+        "min": round(min(samples), 4),
+        "max": round(max(samples), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for each milestone")
+    parser.add_argument("--real-openai", action="store_true", help="Use the configured Azure OpenAI instead of the fake")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not args.real_openai:
+        fake = start_fake_azure_openai()
+        env.update({
+            "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{fake.server_address[1]}",
+            "AZURE_OPENAI_KEY": "fake",
+            "AZURE_OPENAI_DEPLOYMENT": env.get("AZURE_OPENAI_DEPLOYMENT", "chat"),
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": env.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "embed"),
+        })
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    servers = [measure_server(env, args.timeout) for _ in range(args.runs)]
+    milestones = {}
+    for run in servers:
+        for name, seconds in run.items():
+            milestones.setdefault(name, []).append(seconds)
+    print(json.dumps({
+        "import_api_s": _summarize(imports),
+        **{name: _summarize(samples) for name, samples in milestones.items()},
+    }, indent=2))
@@ -0,0 +1,159 @@
+"""
+Recall vs latency of the Chroma HNSW index against exact search, on a synthetic clustered corpus of
+unit-length vectors shaped like the embeddings the app stores, plus the recall cost of storing
+vectors as float16 or int8 (see embeddings.quantize).
+
+    python bench/vector_benchmark.py --corpus 20000 --dim 1536 > vectors.json
+    python bench/vector_benchmark.py --m 8 16 32 --construction-ef 100 200 --search-ef 10 50 100 200
+
+Each (M, ef_construction) pair builds a persistent collection in a temp dir once. Chroma keeps
+the ef_search of an index it has loaded, so each ef_search runs on a fresh copy of that directory
+opened by a new client, which also measures a cold load. Recall@k is the overlap with exact top-k,
+averaged over the queries.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embeddings import EMBEDDING_DTYPES, quantize, dequantize  # noqa: E402
+from vector_store import hnsw_configuration  # noqa: E402
+
+ADD_BATCH_SIZE = 5000
+
+
+def make_corpus(size, dim, clusters, queries, seed, spread=1.0):
+    """
+    Corpus and query vectors around shared cluster centres (chunks of one client look alike),
+    normalised to unit length like OpenAI embeddings. spread is the noise relative to the centres;
+    higher is harder for the index.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    corpus = centres[rng.integers(clusters, size=size)] + rng.normal(scale=spread, size=(size, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    picked = corpus[rng.integers(size, size=queries)]
+    query_vectors = picked + rng.normal(scale=0.02, size=picked.shape).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return corpus, query_vectors
+
+
+def exact_top_k(corpus, query_vectors, k):
+    # On unit vectors the largest dot products are the smallest L2 distances
+    scores = query_vectors @ corpus.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def _recall(found, truth, k):
+    return statistics.mean(len(f & t) / k for f, t in zip(found, truth))
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def benchmark_hnsw(corpus, query_vectors, truth, k, m_values, construction_efs, search_efs):
+    import chromadb
+    results = []
+    ids = [str(i) for i in range(len(corpus))]
+    for m in m_values:
+        for construction_ef in construction_efs:
+            work_dir = tempfile.mkdtemp(prefix="vector-benchmark-")
+            built = os.path.join(work_dir, "built")
+            try:
+                collection = chromadb.PersistentClient(path=built).create_collection(
+                    "benchmark", configuration=hnsw_configuration(m=m, construction_ef=construction_ef),
+                )
+                started = time.perf_counter()
+                for i in range(0, len(corpus), ADD_BATCH_SIZE):
+                    collection.add(ids=ids[i:i + ADD_BATCH_SIZE], embeddings=corpus[i:i + ADD_BATCH_SIZE])
+                build_seconds = time.perf_counter() - started
+                disk_mb = round(_directory_bytes(built) / 2**20, 1)
+                for search_ef in search_efs:
+                    path = os.path.join(work_dir, f"ef{search_ef}")
+                    shutil.copytree(built, path)
+                    collection = chromadb.PersistentClient(path=path).get_collection("benchmark")
+                    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                    started = time.perf_counter()
+                    collection.query(query_embeddings=[query_vectors[0]], n_results=k, include=[])
+                    cold_query_ms = (time.perf_counter() - started) * 1000
+                    found, latencies = [], []
+                    for query in query_vectors:
+                        started = time.perf_counter()
+                        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        found.append({int(i) for i in result["ids"][0]})
+                    latencies.sort()
+                    results.append({
+                        "m": m,
+                        "construction_ef": construction_ef,
+                        "search_ef": search_ef,
+                        "recall_at_k": round(_recall(found, truth, k), 4),
+                        "p50_ms": round(statistics.median(latencies), 3),
+                        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+                        "cold_query_ms": round(cold_query_ms, 1),
+                        "build_seconds": round(build_seconds, 2),
+                        "disk_mb": disk_mb,
+                    })
+                    print(f"M={m:<3} ef_c={construction_ef:<4} ef_s={search_ef:<4} recall={results[-1]['recall_at_k']:.4f} "
+                          f"p50={results[-1]['p50_ms']}ms", file=sys.stderr)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def benchmark_exact(corpus, query_vectors, k):
+    latencies = []
+    for query in query_vectors:
+        started = time.perf_counter()
+        exact_top_k(corpus, query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {"p50_ms": round(statistics.median(latencies), 3), "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3)}
+
+
+def benchmark_quantization(corpus, query_vectors, truth, k):
+    """
+    Exact search over vectors round-tripped through each storage dtype: what quantizing costs in recall.
+    """
+    results = {}
+    for dtype in EMBEDDING_DTYPES:
+        blobs = [quantize(vector, dtype) for vector in corpus]
+        restored = np.stack([dequantize(blob, dtype) for blob in blobs])
+        results[dtype] = {
+            "bytes_per_vector": len(blobs[0]),
+            "recall_at_k": round(_recall(exact_top_k(restored, query_vectors, k), truth, k), 4),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=20000, help="Number of vectors")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.0, help="Noise around cluster centres, relative to the centres")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus, query_vectors = make_corpus(args.corpus, args.dim, args.clusters, args.queries, args.seed, args.spread)
+    truth = exact_top_k(corpus, query_vectors, args.k)
+    report = {
+        "config": vars(args),
+        "exact": benchmark_exact(corpus, query_vectors, args.k),
+        "quantization": benchmark_quantization(corpus, query_vectors, truth, args.k),
+        "hnsw": benchmark_hnsw(corpus, query_vectors, truth, args.k, args.m, args.construction_ef, args.search_ef),
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,246 @@
+"""
+Bulk goal balance import for month-end custodian files.
+
+    python bulk_import.py balances.csv
+    python bulk_import.py balances.ndjson --format ndjson
+
+Each row needs client_id, goal_id and current_amount. Rows are validated against
+goals/clients a batch at a time, written with set-based statements, and messages
+are generated with bounded concurrency using the same helpers as /update-goal-amount.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from dotenv import load_dotenv
+from db import get_engine
+from metrics import log_event
+from message_generator import calculate_progress_percent, detect_progress_change, generate_message, template_fallback, MESSAGE_LLM_TIMEOUT
+
+load_dotenv()
+
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "1000"))
+BULK_IMPORT_MESSAGE_CONCURRENCY = int(os.getenv("BULK_IMPORT_MESSAGE_CONCURRENCY", "8"))
+
+REQUIRED_FIELDS = ("client_id", "goal_id", "current_amount")
+
+
+class RowParser:
+    """
+    Turns CSV or NDJSON text lines into row dicts one line at a time, so input can be streamed.
+    """
+
+    def __init__(self, fmt="csv"):
+        if fmt not in ("csv", "ndjson"):
+            raise ValueError(f"Unsupported format: {fmt}")
+        self.fmt = fmt
+        self.header = None
+        self.first_line = True
+
+    def feed(self, line):
+        if self.first_line:
+            # Excel and many exports start the file with a UTF-8 byte order mark
+            self.first_line = False
+            line = line.lstrip("\ufeff")
+        line = line.strip()
+        if not line:
+            return None
+        if self.fmt == "ndjson":
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"Expected a JSON object, got {type(row).__name__}")
+            return row
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [v.strip() for v in values]
+            return None
+        return dict(zip(self.header, values))
+
+
+def validate_row(raw):
+    missing = [f for f in REQUIRED_FIELDS if raw.get(f) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    return {
+        "client_id": int(raw["client_id"]),
+        "goal_id": int(raw["goal_id"]),
+        "current_amount": float(raw["current_amount"]),
+    }
+
+
+def _fetch_goals(conn, goal_ids):
+    result = conn.execute(text("""
+        SELECT g.id, g.client_id, g.goal_amount, g.current_amount, g.goal_type, c.client_name, l.last_message_sent
+        FROM goals g
+        JOIN clients c ON g.client_id = c.id
+        LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+        WHERE g.id = ANY(CAST(:goal_ids AS integer[]))
+    """), {"goal_ids": goal_ids})
+    return {row.id: row for row in result}
+
+
+def _generate(client_dict, progress_percent, progress_change):
+    try:
+        return generate_message(client_dict, progress_percent, progress_change)
+    except Exception as e:
+        log_event("bulk_import_message_failed", logging.WARNING, error=str(e))
+        return template_fallback(client_dict, progress_percent, progress_change, "error")
+
+
+class BulkImporter:
+    """
+    Applies balance rows batch by batch and accumulates per-row outcomes and throughput.
+    """
+
+    def __init__(self, message_concurrency=BULK_IMPORT_MESSAGE_CONCURRENCY):
+        self.executor = ThreadPoolExecutor(max_workers=message_concurrency, thread_name_prefix="bulk-msg")
+        self.results = []
+        self.updated_goal_ids = {}  # goal_id -> client_id
+        self.started = time.perf_counter()
+        self.row_number = 0
+
+    def process_batch(self, raw_rows):
+        rows = []
+        for raw in raw_rows:
+            self.row_number += 1
+            if "_error" in raw:
+                self.results.append({"row": self.row_number, "status": "invalid", "error": raw["_error"]})
+                continue
+            try:
+                row = validate_row(raw)
+            except (ValueError, TypeError) as e:
+                self.results.append({"row": self.row_number, "status": "invalid", "error": str(e)})
+                continue
+            row["row"] = self.row_number
+            rows.append(row)
+        if not rows:
+            return
+
+        engine = get_engine()
+        with engine.connect() as conn:
+            goals = _fetch_goals(conn, sorted({r["goal_id"] for r in rows}))
+
+        # Walk rows in file order so repeated goals chain off the previous row's balance
+        pending = []
+        balances = {}
+        for row in rows:
+            goal = goals.get(row["goal_id"])
+            if goal is None or goal.client_id != row["client_id"]:
+                self.results.append({"row": row["row"], "goal_id": row["goal_id"], "client_id": row["client_id"],
+                                     "status": "not_found", "error": "Goal not found for this client."})
+                continue
+            previous = balances.get(goal.id, (float(goal.current_amount), goal.last_message_sent))
+            progress_percent = calculate_progress_percent(row["current_amount"], float(goal.goal_amount))
+            progress_change = detect_progress_change(row["current_amount"], previous[0])
+            client_dict = {
+                "client_name": goal.client_name,
+                "goal_type": goal.goal_type,
+                "goal_amount": float(goal.goal_amount),
+                "current_value": row["current_amount"],
+                "last_month_value": previous[0],
+                "last_message_sent": previous[1]
+            }
+            future = self.executor.submit(_generate, client_dict, progress_percent, progress_change)
+            pending.append((row, goal, future, client_dict, progress_percent, progress_change))
+            balances[goal.id] = (row["current_amount"], None)
+
+        messages = []
+        for row, goal, future, client_dict, progress_percent, progress_change in pending:
+            try:
+                message = future.result(timeout=MESSAGE_LLM_TIMEOUT)
+            except Exception:
+                message = template_fallback(client_dict, progress_percent, progress_change, "timeout")
+            messages.append(message)
+
+        if pending:
+            with engine.begin() as conn:
+                # Goals get their last balance in the batch; history gets every row
+                conn.execute(text("""
+                    UPDATE goals g SET current_amount = v.current_amount
+                    FROM unnest(CAST(:goal_ids AS integer[]), CAST(:amounts AS numeric[])) AS v(goal_id, current_amount)
+                    WHERE g.id = v.goal_id
+                """), {"goal_ids": list(balances.keys()), "amounts": [b[0] for b in balances.values()]})
+                conn.execute(text("""
+                    INSERT INTO goal_history (goal_id, goal_amount, current_amount, last_message_sent, created_at)
+                    SELECT v.goal_id, v.goal_amount, v.current_amount, v.message, NOW()
+                    FROM unnest(CAST(:goal_ids AS integer[]), CAST(:goal_amounts AS numeric[]),
+                                CAST(:amounts AS numeric[]), CAST(:messages AS text[]))
+                         AS v(goal_id, goal_amount, current_amount, message)
+                """), {
+                    "goal_ids": [p[1].id for p in pending],
+                    "goal_amounts": [p[1].goal_amount for p in pending],
+                    "amounts": [p[0]["current_amount"] for p in pending],
+                    "messages": messages,
+                })
+
+        for (row, goal, *_), message in zip(pending, messages):
+            self.updated_goal_ids[goal.id] = goal.client_id
+            self.results.append({"row": row["row"], "goal_id": goal.id, "client_id": goal.client_id,
+                                 "status": "updated", "motivational_message": message})
+
+    def summary(self, errors_only=False):
+        elapsed = time.perf_counter() - self.started
+        updated = sum(1 for r in self.results if r["status"] == "updated")
+        results = [r for r in self.results if r["status"] != "updated"] if errors_only else self.results
+        return {
+            "total": len(self.results),
+            "updated": updated,
+            "failed": len(self.results) - updated,
+            "goals_updated": len(self.updated_goal_ids),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(len(self.results) / elapsed, 1) if elapsed > 0 else None,
+            "results": sorted(results, key=lambda r: r["row"]),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def import_lines(lines, fmt="csv", batch_size=BULK_IMPORT_BATCH_SIZE):
+    """
+    Import from any iterable of text lines (e.g. an open file); returns the importer.
+    """
+    parser = RowParser(fmt)
+    importer = BulkImporter()
+    batch = []
+    try:
+        for line in lines:
+            try:
+                raw = parser.feed(line)
+            except (ValueError, json.JSONDecodeError) as e:
+                raw = {"_error": str(e)}
+            if raw is None:
+                continue
+            batch.append(raw)
+            if len(batch) >= batch_size:
+                importer.process_batch(batch)
+                batch = []
+        if batch:
+            importer.process_batch(batch)
+    finally:
+        importer.close()
+    return importer
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    arg_parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    arg_parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    arg_parser.add_argument("--errors-only", action="store_true", help="Only list rows that failed")
+    args = arg_parser.parse_args()
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        importer = import_lines(sys.stdin, fmt, args.batch_size)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            importer = import_lines(f, fmt, args.batch_size)
+    # Refresh the RAG index for everything that changed
+    from vector_sync import sync_goals_quietly
+    sync_goals_quietly(list(importer.updated_goal_ids))
+    print(json.dumps(importer.summary(errors_only=args.errors_only), indent=2, default=str))
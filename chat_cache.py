@@ -0,0 +1,128 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "600"))
+# How many prior messages count as "relevant history" in an answer cache key
+CHAT_CACHE_HISTORY_TURNS = int(os.getenv("CHAT_CACHE_HISTORY_TURNS", "2"))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and tag-based invalidation.
+    """
+
+    def __init__(self, maxsize=CHAT_CACHE_MAX_ENTRIES, ttl=CHAT_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            removed = 0
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Layered caches for /api/ai-chat: query embedding -> retrieval results -> final answer
+query_embedding_cache = TTLCache()
+retrieval_cache = TTLCache()
+answer_cache = TTLCache()
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def answer_cache_key(question, chat_history, scope_key=""):
+    """
+    Key on the normalized question plus the last few history turns, which is what
+    the question-condensing step actually looks at, and the retrieval scope.
+    """
+    recent = chat_history[-CHAT_CACHE_HISTORY_TURNS:] if CHAT_CACHE_HISTORY_TURNS else []
+    parts = [scope_key, normalize_question(question)] + [f"{role}:{normalize_question(content)}" for role, content in recent]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def tags_for_documents(documents):
+    """
+    Invalidation tags for the client/goal ids carried in document metadata.
+    """
+    tags = set()
+    for doc in documents:
+        metadata = getattr(doc, "metadata", None) or {}
+        if metadata.get("goal_id") is not None:
+            tags.add(f"goal:{metadata['goal_id']}")
+        if metadata.get("client_id") is not None:
+            tags.add(f"client:{metadata['client_id']}")
+    return tags
+
+
+def invalidate_goal(client_id, goal_id):
+    """
+    Drop cached retrievals and answers that touched this goal or client.
+    """
+    tags = [f"goal:{goal_id}", f"client:{client_id}"]
+    return retrieval_cache.invalidate_tags(tags) + answer_cache.invalidate_tags(tags)
+
+
+def cache_stats():
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
@@ -0,0 +1,160 @@
+import os
+import hashlib
+import openai
+from dotenv import load_dotenv
+from chat_cache import TTLCache
+from embeddings import count_tokens
+from metrics import span, record_llm_usage
+
+load_dotenv()
+
+AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+openai.api_type = "azure"
+openai.api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
+openai.api_version = os.getenv("AZURE_OPENAI_VERSION", "2023-05-15")
+openai.api_key = os.getenv("AZURE_OPENAI_KEY")
+
+# Tokens of prior conversation forwarded to the chain, summary included
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+# Most recent messages that are always kept, verbatim when they fit the budget and cut down when they don't
+CHAT_HISTORY_MIN_RECENT = int(os.getenv("CHAT_HISTORY_MIN_RECENT", "2"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+CHAT_SUMMARY_TIMEOUT = float(os.getenv("CHAT_SUMMARY_TIMEOUT", "10"))
+
+SUMMARY_PREFIX = "Summary of earlier conversation: "
+
+# session key -> {"covered": n messages folded in, "digest": hash of those messages, "summary": text}
+summary_cache = TTLCache(maxsize=4096, ttl=6 * 3600)
+
+
+def _digest(turns):
+    h = hashlib.sha256()
+    for role, content in turns:
+        h.update(f"{role}\0{content}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _format_turns(turns):
+    return "\n".join(f"{role}: {content}" for role, content in turns)
+
+
+def _truncate(text, max_tokens):
+    # Cheap fallback when no LLM is available: keep roughly the first max_tokens tokens
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+
+def _fit(text, max_tokens):
+    """
+    text cut at a word boundary to at most max_tokens tokens, or "" if nothing fits.
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = len(text) * max_tokens // tokens
+    while cut > 0:
+        candidate = text[:cut].rsplit(" ", 1)[0] + " ..."
+        if count_tokens(candidate) <= max_tokens:
+            return candidate
+        cut = cut * 9 // 10
+    return ""
+
+
+def summarize_turns(previous_summary, turns):
+    """
+    Fold turns into the rolling summary with one short completion call.
+    """
+    transcript = _format_turns(turns)
+    prompt = (
+        "Update the running summary of an advisor's chat with a financial assistant. "
+        "Keep client names, goals, amounts and any open questions; drop pleasantries. "
+        f"Reply with the summary only, under {CHAT_SUMMARY_MAX_TOKENS} tokens.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+    )
+    if AZURE_OPENAI_DEPLOYMENT and openai.api_key and openai.api_base:
+        try:
+            with span("llm", "chat_summary"):
+                response = openai.ChatCompletion.create(
+                    engine=AZURE_OPENAI_DEPLOYMENT,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+                    temperature=0.0,
+                    request_timeout=CHAT_SUMMARY_TIMEOUT,
+                )
+            record_llm_usage("chat_summary", response.get("usage"))
+            return response.choices[0].message["content"].strip()
+        except Exception:
+            # Logged by span(); truncating instead
+            pass
+    combined = f"{previous_summary}\n{transcript}" if previous_summary else transcript
+    return _truncate(combined, CHAT_SUMMARY_MAX_TOKENS)
+
+
+def _rolling_summary(session_key, older):
+    """
+    Summary of `older` for this session, extending the cached one when only new turns were added.
+    """
+    cached = summary_cache.get(session_key)
+    if cached and cached["covered"] <= len(older) and cached["digest"] == _digest(older[:cached["covered"]]):
+        if cached["covered"] == len(older):
+            return cached["summary"], True
+        summary = summarize_turns(cached["summary"], older[cached["covered"]:])
+    else:
+        summary = summarize_turns(None, older)
+    summary_cache.set(session_key, {"covered": len(older), "digest": _digest(older), "summary": summary})
+    return summary, False
+
+
+def compact_history(turns, session_id=None, budget=CHAT_HISTORY_TOKEN_BUDGET):
+    """
+    Fit (role, content) turns into a token budget: the newest turns are kept verbatim, and
+    anything older is folded into a rolling summary cached per session. The last
+    CHAT_HISTORY_MIN_RECENT turns are kept even when they don't fit, cut down to what is left.
+    The result never exceeds budget. Returns (compacted turns, token usage report).
+    """
+    counts = [count_tokens(content) for _, content in turns]
+    original_tokens = sum(counts)
+    usage = {"history_tokens_in": original_tokens, "summarized_messages": 0, "clipped_messages": 0,
+             "summary_tokens": 0, "summary_cached": False}
+    if original_tokens <= budget:
+        usage["history_tokens_out"] = original_tokens
+        return list(turns), usage
+
+    # Keep as many recent turns as fit in the budget, reserving room for the summary
+    keep_budget = max(budget - CHAT_SUMMARY_MAX_TOKENS, 0)
+    recent, used = [], 0
+    for (role, content), count in zip(reversed(turns), reversed(counts)):
+        if used + count <= keep_budget:
+            recent.append((role, content))
+            used += count
+            continue
+        if len(recent) >= CHAT_HISTORY_MIN_RECENT:
+            break
+        # Too recent to summarize away, too long to keep whole: keep its start, sharing what is
+        # left with the other turns that must be kept
+        clipped = _fit(content, (keep_budget - used) // (CHAT_HISTORY_MIN_RECENT - len(recent)))
+        if not clipped:
+            break
+        recent.append((role, clipped))
+        used += count_tokens(clipped)
+        usage["clipped_messages"] += 1
+    recent.reverse()
+    older = turns[:len(turns) - len(recent)]
+    if not older:
+        usage["history_tokens_out"] = used
+        return recent, usage
+
+    # Without a session id, the first turn identifies the conversation
+    session_key = session_id or _digest(turns[:1])
+    summary, cached = _rolling_summary(session_key, older)
+    summary_text = _fit(SUMMARY_PREFIX + summary, budget - used)
+    summary_tokens = count_tokens(summary_text) if summary_text else 0
+    usage.update({
+        "summarized_messages": len(older),
+        "summary_tokens": summary_tokens,
+        "summary_cached": cached,
+        "history_tokens_out": summary_tokens + used,
+    })
+    return ([("system", summary_text)] if summary_text else []) + recent, usage
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import threading
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+from metrics import span
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+if not DATABASE_URL:
+    DB_HOST = os.getenv('DB_HOST', 'localhost')
+    DB_PORT = os.getenv('DB_PORT', '5432')
+    DB_NAME = os.getenv('DB_NAME', 'investment_db')
+    DB_USER = os.getenv('DB_USER', 'user')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
+    DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Async mode swaps the driver for asyncpg; the rest of the URL is shared
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', DATABASE_URL.replace("+psycopg2", "+asyncpg"))
+
+# Connection pool config
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_ASYNC = os.getenv('DB_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', '100'))
+
+_engine = None
+_async_engine = None
+_lock = threading.Lock()
+
+
+def _pool_kwargs():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def get_engine():
+    """
+    Return the process-wide SQLAlchemy engine, creating it (and its pool) on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_engine(DATABASE_URL, **_pool_kwargs())
+    return _engine
+
+
+def get_async_engine():
+    """
+    Return the process-wide AsyncEngine when DB_ASYNC is enabled, otherwise None.
+    """
+    global _async_engine
+    if not DB_ASYNC:
+        return None
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+                _async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_kwargs())
+    return _async_engine
+
+
+def init_engines():
+    """
+    Build the engines up front so the first request doesn't pay for it.
+    """
+    get_engine()
+    get_async_engine()
+
+
+async def dispose_engines():
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+async def run_db(fn, *args, transaction=False):
+    """
+    Run fn(conn, *args) against the shared pool without blocking the event loop.
+    In async mode fn runs on an asyncpg connection through AsyncConnection.run_sync,
+    otherwise it runs on a pooled psycopg2 connection in a worker thread.
+    """
+    with span("db", getattr(fn, "__name__", "query")):
+        async_engine = get_async_engine()
+        if async_engine is not None:
+            if transaction:
+                async with async_engine.begin() as conn:
+                    return await conn.run_sync(fn, *args)
+            async with async_engine.connect() as conn:
+                return await conn.run_sync(fn, *args)
+
+        def call():
+            engine = get_engine()
+            if transaction:
+                with engine.begin() as conn:
+                    return fn(conn, *args)
+            with engine.connect() as conn:
+                return fn(conn, *args)
+
+        return await asyncio.to_thread(call)
+
+
+async def stream_rows(statement, params=None):
+    """
+    Async-iterate the rows of a query through a server-side cursor, so large
+    results are never held in memory at once.
+    """
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            result = await conn.stream(statement, params or {})
+            async for row in result:
+                yield row
+        return
+
+    from starlette.concurrency import iterate_in_threadpool
+
+    def rows():
+        with get_engine().connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE).execute(statement, params or {})
+            for row in result:
+                yield row
+
+    async for row in iterate_in_threadpool(rows()):
+        yield row
@@ -0,0 +1,196 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import openai
+from dotenv import load_dotenv
+from metrics import span, log_event, record_llm_usage
+
+load_dotenv()
+
+# OpenAI config
+openai.api_type = "azure"
+openai.api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
+openai.api_version = os.getenv("AZURE_OPENAI_VERSION", "2023-05-15")
+openai.api_key = os.getenv("AZURE_OPENAI_KEY")
+
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+
+# Batching limits: inputs per request, tokens per request, and requests in flight
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./chroma_db/embedding_cache.sqlite3")
+# How cached vectors are stored: float32 (exact), float16 (half the size) or int8 (a quarter, plus one scale per vector).
+# Rows keep the format they were written in, so this can change without clearing the cache.
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32").lower()
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Token count with the cl100k_base encoding. tiktoken downloads the encoding on
+    first use; if that fails (offline container) fall back to ~4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            log_event("tiktoken_unavailable", logging.WARNING, error=str(e))
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+
+def quantize(vector, dtype=EMBEDDING_CACHE_DTYPE):
+    """
+    Encode a vector as bytes in dtype; int8 is symmetric per vector, with its float32 scale first.
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    if dtype == "float16":
+        return array.astype(np.float16).tobytes()
+    if dtype == "int8":
+        scale = float(np.abs(array).max()) / 127 or 1.0
+        return np.float32(scale).tobytes() + np.round(array / scale).astype(np.int8).tobytes()
+    return array.tobytes()
+
+
+def dequantize(blob, dtype="float32"):
+    if dtype == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by sha256(model + text), so unchanged chunks are never re-embedded.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, dtype=EMBEDDING_CACHE_DTYPE):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.dtype = dtype
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "dtype" not in columns:
+            # Caches written before quantization hold float32 vectors
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        self._conn.commit()
+
+    @staticmethod
+    def key(text, model):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector, dtype FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob, dtype in rows:
+                    found[key] = dequantize(blob, dtype).tolist()
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, dtype) VALUES (?, ?, ?)",
+                [(key, quantize(vector, self.dtype), self.dtype) for key, vector in items],
+            )
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def make_batches(texts, max_items=EMBEDDING_BATCH_SIZE, max_tokens=EMBEDDING_BATCH_TOKENS):
+    """
+    Split texts into batches bounded by both item count and total token count.
+    """
+    batches, batch, batch_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_batch(batch, deployment):
+    with span("embedding", "batch", inputs=len(batch)):
+        response = openai.Embedding.create(input=batch, engine=deployment)
+    record_llm_usage("embedding", response.get("usage"))
+    # The API may return items out of order; index tells us which input each belongs to
+    data = sorted(response["data"], key=lambda d: d["index"])
+    return [d["embedding"] for d in data]
+
+
+def embed_query(text, deployment=None):
+    """
+    Embed one chat question with a direct call. Questions stay out of the on-disk cache, which is
+    for chunks: they rarely repeat word for word and can name clients. Repeats within a process
+    are served by chat_cache.query_embedding_cache.
+    """
+    return _embed_batch([text], deployment or EMBEDDING_DEPLOYMENT)[0]
+
+
+def embed_texts(texts, deployment=None):
+    """
+    Embed a list of texts, serving repeats from the on-disk cache and requesting
+    the rest in bounded batches with at most EMBEDDING_MAX_CONCURRENCY calls in flight.
+    Returns one embedding per input text, in order.
+    """
+    deployment = deployment or EMBEDDING_DEPLOYMENT
+    cache = get_embedding_cache()
+    keys = [EmbeddingCache.key(t, deployment) for t in texts]
+    vectors = cache.get_many(list(set(keys)))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing.setdefault(key, text)
+    if missing:
+        batches = make_batches(list(missing.values()))
+        with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_CONCURRENCY) as pool:
+            results = list(pool.map(lambda b: _embed_batch(b, deployment), batches))
+        new_items = []
+        for batch, embedded in zip(batches, results):
+            for text, vector in zip(batch, embedded):
+                key = EmbeddingCache.key(text, deployment)
+                vectors[key] = vector
+                new_items.append((key, vector))
+        cache.put_many(new_items)
+    return [vectors[key] for key in keys]
+
@@ -0,0 +1,293 @@
+import re
+import time
+import threading
+from sqlalchemy import text
+from db import get_engine
+from projections import project_goals
+
+# Client names change rarely; reload them at most this often for name matching
+CLIENT_NAMES_TTL_SECONDS = 60
+
+CLIENT_COUNT_SQL = text("SELECT count(*) FROM clients")
+CLIENT_LIST_SQL = text("SELECT id, client_name FROM clients ORDER BY client_name")
+CLIENT_BY_ID_SQL = text("SELECT id, client_name FROM clients WHERE id = :client_id")
+CLIENT_GOALS_SQL = text("""
+    SELECT g.id, g.goal_type, g.goal_amount::float8 AS goal_amount, g.current_amount::float8 AS current_amount,
+           g.monthly_contribution::float8 AS monthly_contribution, g.withdrawal_period_months,
+           g.expected_return_rate::float8 AS expected_return_rate
+    FROM goals g
+    WHERE g.client_id = :client_id
+    ORDER BY g.goal_type
+""")
+ALL_GOALS_SQL = text("""
+    SELECT g.id, c.client_name, g.goal_type, g.goal_amount::float8 AS goal_amount, g.current_amount::float8 AS current_amount,
+           g.monthly_contribution::float8 AS monthly_contribution, g.withdrawal_period_months,
+           g.expected_return_rate::float8 AS expected_return_rate
+    FROM goals g
+    JOIN clients c ON g.client_id = c.id
+    WHERE CAST(:client_id AS integer) IS NULL OR g.client_id = CAST(:client_id AS integer)
+    ORDER BY c.client_name, g.goal_type
+""")
+TOTALS_BY_GOAL_TYPE_SQL = text("""
+    SELECT goal_type, count(*) AS goals, sum(current_amount)::float8 AS current_total, sum(goal_amount)::float8 AS target_total
+    FROM goals
+    GROUP BY goal_type
+    ORDER BY goal_type
+""")
+
+CLIENT_COUNT_PATTERN = re.compile(r"\b(how many clients|number of clients|client count|count of clients|total clients)\b")
+CLIENT_LIST_PATTERN = re.compile(r"\b(list (all |of |my )*clients|who are my clients|client names|names of (my |all )?clients)\b")
+OFF_TRACK_PATTERN = re.compile(r"\b(off[- ]track|not on track|behind|falling short|at risk)\b")
+TOTALS_PATTERN = re.compile(r"\b(total|totals|sum|aggregate)\b.*\b(goal type|by type|per type|each type|by goal)\b")
+# Words that leave a count, list or totals question unqualified. Anything else ("off track",
+# "retirement", "over 60") is a filter those answers would ignore.
+AGGREGATE_FILLER_WORDS = frozenset("""
+    a all am an and any are at can could currently do does get give have how i in is it me my now of on
+    our please right s show tell the there total ve we what who you your
+""".split())
+TOTALS_WORDS = AGGREGATE_FILLER_WORDS | frozenset("""
+    aggregate amount amounts across balance balances by current each goal goals per saved savings sum
+    target targeted targets total totals type types
+""".split())
+# Requests for advice or prose need the LLM even when they mention a client
+OPEN_ENDED_PATTERN = re.compile(r"\b(why|explain|suggest|recommend|advice|advise|should|write|draft|compose|summari[sz]e|compare|what if)\b")
+# Words that point back at an earlier turn ("which of her goals...", "that client")
+BACK_REFERENCE_PATTERN = re.compile(r"\b(she|her|hers|he|him|his|they|them|their|those|these|this client|that client|the client|same client)\b")
+PROGRESS_PATTERN = re.compile(r"\b(progress|doing|status|on track|goals?|how is|how's|how are)\b")
+
+
+def _only_words(text, allowed):
+    return all(word in allowed for word in re.findall(r"[a-z0-9]+", text))
+
+
+def _money(value):
+    return f"${value:,.0f}"
+
+
+class RouterStats:
+    """
+    Hit counts and latency per answer path (each SQL intent, plus 'rag' for fall-through).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def record(self, path, seconds):
+        with self._lock:
+            stats = self._paths.setdefault(path, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            stats["count"] += 1
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(s["count"] for s in self._paths.values())
+            routed = sum(s["count"] for path, s in self._paths.items() if path != "rag")
+            return {
+                "total": total,
+                "sql_hit_rate": round(routed / total, 3) if total else None,
+                "paths": {
+                    path: {
+                        "count": s["count"],
+                        "avg_ms": round(s["total_ms"] / s["count"], 2),
+                        "max_ms": round(s["max_ms"], 2),
+                    }
+                    for path, s in self._paths.items()
+                },
+            }
+
+
+router_stats = RouterStats()
+
+_client_names = {"loaded_at": 0.0, "full": {}, "first": {}, "full_pattern": None, "first_pattern": None}
+_client_names_lock = threading.Lock()
+
+
+def _name_pattern(names):
+    # Longest names first, so "jane doe-smith" wins over "jane doe"
+    if not names:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + r")\b")
+
+
+def _known_clients(conn=None):
+    """
+    Client name index, reloaded at most every CLIENT_NAMES_TTL_SECONDS: lowercased full and first
+    names mapped to clients, each with one compiled whole-word pattern, so matching is a single
+    regex scan per question rather than one per client. Opens a connection only when reloading
+    without one.
+    """
+    with _client_names_lock:
+        if time.monotonic() - _client_names["loaded_at"] > CLIENT_NAMES_TTL_SECONDS:
+            if conn is None:
+                with get_engine().connect() as own_conn:
+                    rows = own_conn.execute(CLIENT_LIST_SQL).fetchall()
+            else:
+                rows = conn.execute(CLIENT_LIST_SQL).fetchall()
+            _client_names.update(name_index((row.id, row.client_name) for row in rows), loaded_at=time.monotonic())
+        return _client_names
+
+
+def name_index(clients):
+    """
+    Lowercased full and first names mapped to (id, name), with their whole-word patterns.
+    """
+    full, first = {}, {}
+    for client_id, client_name in clients:
+        if not client_name.strip():
+            continue
+        full.setdefault(client_name.lower(), (client_id, client_name))
+        first.setdefault(client_name.split()[0].lower(), []).append((client_id, client_name))
+    return {"full": full, "first": first, "full_pattern": _name_pattern(full), "first_pattern": _name_pattern(first)}
+
+
+def find_clients(conn, question):
+    """
+    Every client named in the question, by full name or else a unique first name, as whole words.
+    Returns [] when nobody is named and None when a first name could be several clients.
+    conn is only used if the name index needs reloading and may be None.
+    """
+    lowered = question.lower()
+    index = _known_clients(conn)
+    clients = []
+    if index["full_pattern"] is not None:
+        for match in index["full_pattern"].finditer(lowered):
+            clients.append(index["full"][match.group(0)])
+        # First names inside a matched full name are not separate mentions
+        lowered = index["full_pattern"].sub(" ", lowered)
+    if index["first_pattern"] is not None:
+        for name in set(index["first_pattern"].findall(lowered)):
+            candidates = index["first"][name]
+            if len(candidates) > 1:
+                return None
+            clients.append(candidates[0])
+    return list(dict.fromkeys(clients))
+
+
+def _answer_client_count(conn, question):
+    count = conn.execute(CLIENT_COUNT_SQL).scalar_one()
+    return f"You have {count} clients."
+
+
+def _answer_client_list(conn, question):
+    names = [row.client_name for row in conn.execute(CLIENT_LIST_SQL)]
+    if not names:
+        return "You don't have any clients yet."
+    return f"You have {len(names)} clients: {', '.join(names)}."
+
+
+def _project(goals):
+    return project_goals(
+        [g.current_amount for g in goals],
+        [g.monthly_contribution or 0 for g in goals],
+        [g.withdrawal_period_months or 0 for g in goals],
+        [g.expected_return_rate or 0 for g in goals],
+        [g.goal_amount for g in goals],
+    )
+
+
+def _answer_off_track(conn, question, client=None):
+    goals = conn.execute(ALL_GOALS_SQL, {"client_id": client[0] if client else None}).fetchall()
+    if not goals:
+        return f"{client[1]} has no goals set up yet." if client else "There are no goals in the system yet."
+    projections = _project(goals)
+    off_track = [
+        f"{g.client_name}'s {g.goal_type} goal (projected shortfall {_money(projections['shortfall'][i])}, "
+        f"needs {_money(projections['required_monthly_contribution'][i])}/month)"
+        for i, g in enumerate(goals) if not projections["on_track"][i]
+    ]
+    if not off_track:
+        return f"All of {client[1]}'s goals are currently on track." if client else "All goals are currently on track."
+    return f"{len(off_track)} of {len(goals)} goals are off track: " + "; ".join(off_track) + "."
+
+
+def _answer_totals_by_goal_type(conn, question):
+    rows = conn.execute(TOTALS_BY_GOAL_TYPE_SQL).fetchall()
+    if not rows:
+        return "There are no goals in the system yet."
+    parts = [
+        f"{row.goal_type}: {row.goals} goals, {_money(row.current_total)} saved of {_money(row.target_total)} targeted"
+        for row in rows
+    ]
+    return "Totals by goal type — " + "; ".join(parts) + "."
+
+
+def _answer_client_progress(conn, question, client):
+    client_id, name = client
+    goals = conn.execute(CLIENT_GOALS_SQL, {"client_id": client_id}).fetchall()
+    if not goals:
+        return f"{name} has no goals set up yet."
+    projections = _project(goals)
+    parts = []
+    for i, g in enumerate(goals):
+        percent = g.current_amount / g.goal_amount * 100 if g.goal_amount else 0
+        status = "on track" if projections["on_track"][i] else "off track"
+        parts.append(f"{g.goal_type}: {_money(g.current_amount)} of {_money(g.goal_amount)} ({percent:.1f}%), {status}")
+    return f"{name}'s goals — " + "; ".join(parts) + "."
+
+
+def classify(question, clients=(), scoped=False, follow_up=False):
+    """
+    The SQL intent for a question, or None when it should go to RAG. clients are the clients it is
+    about (None when a first name was ambiguous); scoped means they came from the caller's explicit
+    client scope rather than from names in the question. Goal scopes never reach here.
+    """
+    lowered = question.lower()
+    if OPEN_ENDED_PATTERN.search(lowered):
+        return None
+    if follow_up and not scoped and BACK_REFERENCE_PATTERN.search(lowered):
+        return None
+    if not scoped:
+        # Only bare count/list/totals questions: "how many clients are off track?" is not a count
+        if CLIENT_COUNT_PATTERN.search(lowered) and _only_words(CLIENT_COUNT_PATTERN.sub(" ", lowered), AGGREGATE_FILLER_WORDS):
+            return "client_count"
+        if CLIENT_LIST_PATTERN.search(lowered) and _only_words(CLIENT_LIST_PATTERN.sub(" ", lowered), AGGREGATE_FILLER_WORDS):
+            return "client_list"
+        if TOTALS_PATTERN.search(lowered) and _only_words(lowered, TOTALS_WORDS):
+            return "totals_by_goal_type"
+    # Several (or ambiguous) clients: a one-client answer would leave the others out
+    if clients is None or len(clients) > 1:
+        return None
+    if not clients and follow_up and not scoped:
+        # "Which goals are behind?" after a turn about one client is about that client
+        return None
+    if OFF_TRACK_PATTERN.search(lowered):
+        return "goals_off_track"
+    if clients and PROGRESS_PATTERN.search(lowered):
+        return "client_goal_progress"
+    return None
+
+
+def route_question(question, scope=None, follow_up=False):
+    """
+    Answer aggregate and lookup questions straight from SQL.
+    scope is the caller's explicit {"client_id", "goal_id"}: routed answers are then limited to that
+    client, and goal scopes go to RAG. follow_up means earlier turns exist; without an explicit scope
+    only questions that name their own subject are routed, the rest need RAG's condense step.
+    Returns (intent, answer), or None when the question should go to RAG.
+    """
+    if scope and (scope.get("goal_id") is not None or scope.get("client_id") is None):
+        return None
+    if OPEN_ENDED_PATTERN.search(question.lower()):
+        return None
+    engine = get_engine()
+    with engine.connect() as conn:
+        if scope:
+            client = conn.execute(CLIENT_BY_ID_SQL, {"client_id": scope["client_id"]}).fetchone()
+            clients = [(client.id, client.client_name)] if client else None
+        else:
+            clients = find_clients(conn, question)
+        intent = classify(question, clients, scoped=bool(scope), follow_up=follow_up)
+        if intent == "client_count":
+            return intent, _answer_client_count(conn, question)
+        if intent == "client_list":
+            return intent, _answer_client_list(conn, question)
+        if intent == "totals_by_goal_type":
+            return intent, _answer_totals_by_goal_type(conn, question)
+        if intent == "goals_off_track":
+            return intent, _answer_off_track(conn, question, clients[0] if clients else None)
+        if intent == "client_goal_progress":
+            return intent, _answer_client_progress(conn, question, clients[0])
+    return None
@@ -1,69 +1,237 @@
 import os
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_community.chat_models import AzureChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
+import time
+import asyncio
+import logging
+import threading
 from dotenv import load_dotenv
+from embeddings import count_tokens
+from chat_history import compact_history
+from chat_cache import answer_cache, answer_cache_key, tags_for_documents
+from metrics import span, log_event, llm_tokens, stage_seconds
 
 load_dotenv()
 
-rag_available = True
+ANSWER_LLM_TAG = "rag_answer"
+# Chunks retrieved per question: across the whole book, per named client, within one goal
+RAG_K_DEFAULT = int(os.getenv("RAG_K_DEFAULT", "7"))
+RAG_K_CLIENT = int(os.getenv("RAG_K_CLIENT", "6"))
+RAG_K_GOAL = int(os.getenv("RAG_K_GOAL", "4"))
+
+RAG_UNAVAILABLE_MESSAGE = "Sorry, retrieval-augmented answers are temporarily unavailable. Please try again later or contact support."
+
+# Built on first use (or by the startup warm-up), so importing this module stays cheap
 embeddings = None
 vectorstore = None
 llm = None
 qa_chain = None
 
-try:
-    embeddings = OpenAIEmbeddings(
-        deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
-        openai_api_type="azure",
-        openai_api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        openai_api_key=os.getenv("AZURE_OPENAI_KEY"),
-        openai_api_version=os.getenv("AZURE_OPENAI_VERSION", "2023-05-15"),
-    )
+_rag_state = {"status": "not_started", "error": None, "started_at": None, "ready_at": None, "init_seconds": None, "vector_store": None}
+_rag_lock = threading.Lock()
 
-    vectorstore = Chroma(
-        collection_name="goals_with_history",
-        embedding_function=embeddings,
-        persist_directory="./chroma_db"
-    )
 
-    llm = AzureChatOpenAI(
+def make_llm(**kwargs):
+    from langchain_community.chat_models import AzureChatOpenAI
+    return AzureChatOpenAI(
         deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
         openai_api_type="azure",
         openai_api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
         openai_api_key=os.getenv("AZURE_OPENAI_KEY"),
         openai_api_version=os.getenv("AZURE_OPENAI_VERSION", "2023-05-15"),
         temperature=0.0,
+        **kwargs,
     )
 
-    qa_chain = ConversationalRetrievalChain.from_llm(
-        llm,
-        vectorstore.as_retriever(search_kwargs={"k": 7}),
-        return_source_documents=True
+
+def init_rag():
+    """
+    Build the embeddings client, vector store, LLMs and chain once per process.
+    Safe to call from any thread; later callers wait for the first to finish.
+    Returns True when the pipeline is usable.
+    """
+    global embeddings, vectorstore, llm, qa_chain
+    if _rag_state["status"] in ("ready", "failed"):
+        return _rag_state["status"] == "ready"
+    with _rag_lock:
+        if _rag_state["status"] in ("ready", "failed"):
+            return _rag_state["status"] == "ready"
+        _rag_state.update(status="initializing", started_at=time.time())
+        started = time.perf_counter()
+        try:
+            from langchain_community.vectorstores import Chroma
+            from langchain.chains import ConversationalRetrievalChain
+            from rag_components import CachedEmbeddings, CachedRetriever
+            from vector_store import COLLECTION_NAME, get_chroma_client, warm_load
+
+            # Batched, disk-cached embeddings shared with rag_utils
+            embeddings = CachedEmbeddings(os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"))
+
+            # Same persistent client and collection as rag_utils; loading the index now keeps it off the first query
+            _rag_state["vector_store"] = warm_load()
+            vectorstore = Chroma(
+                client=get_chroma_client(),
+                collection_name=COLLECTION_NAME,
+                embedding_function=embeddings,
+            )
+
+            llm = make_llm(tags=[ANSWER_LLM_TAG])
+            # Separate, untagged model for question condensing so only answer tokens are streamed
+            condense_llm = make_llm()
+
+            qa_chain = ConversationalRetrievalChain.from_llm(
+                llm,
+                CachedRetriever(retriever=vectorstore.as_retriever(search_kwargs={"k": RAG_K_DEFAULT})),
+                condense_question_llm=condense_llm,
+                return_source_documents=True
+            )
+            _rag_state.update(status="ready", ready_at=time.time())
+        except Exception as e:
+            _rag_state.update(status="failed", error=str(e))
+            log_event("rag_init_failed", logging.ERROR, error=str(e))
+        _rag_state["init_seconds"] = round(time.perf_counter() - started, 3)
+    return _rag_state["status"] == "ready"
+
+
+def get_vectorstore():
+    """
+    The LangChain Chroma store, initializing the pipeline if needed; None if it failed.
+    """
+    init_rag()
+    return vectorstore
+
+
+def rag_status():
+    return dict(_rag_state)
+
+
+def scope_key(scope):
+    if not scope:
+        return ""
+    if scope.get("client_ids"):
+        return f"clients:{','.join(map(str, sorted(scope['client_ids'])))}|goal:{scope.get('goal_id')}"
+    return f"client:{scope.get('client_id')}|goal:{scope.get('goal_id')}"
+
+
+def retrieval_filter(scope):
+    """
+    Chroma metadata filter and k for a {"client_id" or "client_ids", "goal_id"} scope;
+    (None, RAG_K_DEFAULT) for the whole book. Several clients get RAG_K_CLIENT chunks each.
+    """
+    scope = scope or {}
+    conditions = [{key: scope[key]} for key in ("client_id", "goal_id") if scope.get(key) is not None]
+    client_ids = scope.get("client_ids") or []
+    if client_ids:
+        conditions.append({"client_id": {"$in": list(client_ids)}})
+    if not conditions:
+        return None, RAG_K_DEFAULT
+    if scope.get("goal_id") is not None:
+        k = RAG_K_GOAL
+    else:
+        k = RAG_K_CLIENT * max(len(client_ids), 1)
+    return (conditions[0] if len(conditions) == 1 else {"$and": conditions}), k
+
+
+def chain_for_scope(scope):
+    """
+    The QA chain, with retrieval restricted to the scope's client/goal chunks when one is given.
+    A scoped copy shares the LLMs and vector store; only the retriever differs.
+    """
+    where, k = retrieval_filter(scope)
+    if where is None:
+        return qa_chain
+    from langchain.chains import ConversationalRetrievalChain
+    from rag_components import CachedRetriever
+    retriever = vectorstore.as_retriever(search_kwargs={"k": k, "filter": where})
+    return ConversationalRetrievalChain(
+        combine_docs_chain=qa_chain.combine_docs_chain,
+        question_generator=qa_chain.question_generator,
+        retriever=CachedRetriever(retriever=retriever, scope_key=scope_key(scope)),
+        return_source_documents=True,
     )
-except Exception as e:
-    rag_available = False
-    print(f"[ERROR] Failed to initialize RAG pipeline: {e}")
-
-def langchain_ai_chat(messages):
-    if not rag_available:
-        return (
-            "Sorry, retrieval-augmented answers are temporarily unavailable. Please try again later or contact support.",
-            []
-        )
+
+def build_chat_history(messages, session_id=None):
+    """
+    Returns (chat_history, usage): prior turns compacted to the token budget, plus prompt token counts.
+    """
     chat_history = []
     for m in messages[:-1]:
         if m["role"] == "user":
             chat_history.append((m["role"], m["content"]))
         elif m["role"] == "assistant":
             chat_history.append((m["role"], m["content"]))
+    chat_history, usage = compact_history(chat_history, session_id)
     system_message = (
         "system",
         "You are an Advisor AI Assistant. Only answer questions related to finance, financial goals, savings, or client progress. For other topics, politely decline."
     )
-    chat_history = [system_message] + chat_history
-    print("[DEBUG] Chat history sent to LangChain:", chat_history)
+    usage["question_tokens"] = count_tokens(messages[-1]["content"])
+    usage["prompt_tokens"] = count_tokens(system_message[1]) + usage["history_tokens_out"] + usage["question_tokens"]
+    return [system_message] + chat_history, usage
+
+def langchain_ai_chat(messages, session_id=None, scope=None):
+    """
+    Answer the last message with the RAG chain; scope ({"client_id", "goal_id"}) limits retrieval.
+    Returns (answer, source_documents, usage).
+    """
+    if not init_rag():
+        return (RAG_UNAVAILABLE_MESSAGE, [], None)
+    chat_history, usage = build_chat_history(messages, session_id)
+    log_event("rag_chat_history", turns=len(chat_history), prompt_tokens=usage["prompt_tokens"])
+    question = messages[-1]["content"]
+    cache_key = answer_cache_key(question, chat_history, scope_key(scope))
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached + (usage,)
+    chain = chain_for_scope(scope)
+    from langchain_community.callbacks import get_openai_callback
+    with span("rag_chain", "answer"), get_openai_callback() as callback:
+        result = chain({"question": question, "chat_history": chat_history})
+    llm_tokens.inc(callback.prompt_tokens, purpose="rag_answer", kind="prompt")
+    llm_tokens.inc(callback.completion_tokens, purpose="rag_answer", kind="completion")
+    answer, sources = result["answer"], result.get("source_documents", [])
+    answer_cache.set(cache_key, (answer, sources), tags_for_documents(sources))
+    return answer, sources, usage
+
+async def langchain_ai_chat_stream(messages, session_id=None, scope=None):
+    """
+    Streaming variant of langchain_ai_chat. Yields ("usage", prompt token counts), then
+    ("token", text) as the answer is generated, then ("sources", source_documents).
+    Closing the generator cancels the upstream LLM call. scope limits retrieval as in langchain_ai_chat.
+    """
+    if not await asyncio.to_thread(init_rag):
+        yield "token", RAG_UNAVAILABLE_MESSAGE
+        yield "sources", []
+        return
+    chat_history, usage = await asyncio.to_thread(build_chat_history, messages, session_id)
+    yield "usage", usage
     question = messages[-1]["content"]
-    result = qa_chain({"question": question, "chat_history": chat_history})
-    return result["answer"], result.get("source_documents", []) 
\ No newline at end of file
+    cache_key = answer_cache_key(question, chat_history, scope_key(scope))
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        yield "token", cached[0]
+        yield "sources", cached[1]
+        return
+    tokens, result, root_run_id = [], None, None
+    started, outcome = time.perf_counter(), "error"
+    events = chain_for_scope(scope).astream_events({"question": question, "chat_history": chat_history}, version="v1")
+    try:
+        async for event in events:
+            if root_run_id is None:
+                # The first event is the chain's own start; its end carries the sources
+                root_run_id = event["run_id"]
+            if event["event"] == "on_chat_model_stream" and ANSWER_LLM_TAG in event.get("tags", []):
+                token = event["data"]["chunk"].content
+                if token:
+                    tokens.append(token)
+                    yield "token", token
+            elif event["event"] == "on_chain_end" and event["run_id"] == root_run_id:
+                result = event["data"].get("output")
+        outcome = "ok"
+    finally:
+        await events.aclose()
+        # Not a span(): the time the client spends reading between tokens belongs to the stream too
+        stage_seconds.observe(time.perf_counter() - started, stage="rag_chain", operation="answer_stream", outcome=outcome)
+        # Streamed responses carry no usage; each streamed chunk is one token
+        llm_tokens.inc(len(tokens), purpose="rag_answer_stream", kind="completion")
+    sources = (result or {}).get("source_documents", [])
+    answer_cache.set(cache_key, ("".join(tokens), sources), tags_for_documents(sources))
+    yield "sources", sources
@@ -1,17 +1,23 @@
 import random
 import os
+import logging
 from dotenv import load_dotenv
+from metrics import span, log_event, messages_generated, record_llm_usage
 
 # Load environment variables from .env
 load_dotenv()
 
+# Upper bound on a single completion request, in seconds; past it callers fall back to templates
+MESSAGE_LLM_TIMEOUT = float(os.getenv("MESSAGE_LLM_TIMEOUT", "8"))
+# Background completions that fill the message pool (message_pool.py) can take longer
+MESSAGE_POOL_LLM_TIMEOUT = float(os.getenv("MESSAGE_POOL_LLM_TIMEOUT", "30"))
+
 try:
     import openai
     AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
     AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
     AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
     AZURE_OPENAI_VERSION = os.getenv("AZURE_OPENAI_VERSION", "2023-05-15")
-    print("[DEBUG] Azure OpenAI Key Loaded:", bool(AZURE_OPENAI_KEY))
     OPENAI_AVAILABLE = AZURE_OPENAI_KEY is not None and AZURE_OPENAI_ENDPOINT is not None and AZURE_OPENAI_DEPLOYMENT is not None
     if OPENAI_AVAILABLE:
         openai.api_type = "azure"
@@ -19,7 +25,7 @@ try:
         openai.api_version = AZURE_OPENAI_VERSION
         openai.api_key = AZURE_OPENAI_KEY
 except ImportError:
-    print("[DEBUG] OpenAI import failed.")
+    log_event("openai_import_failed", logging.WARNING)
     OPENAI_AVAILABLE = False
 
 def calculate_progress_percent(current_value, goal_amount):
@@ -35,7 +41,6 @@ def detect_progress_change(current_value, last_month_value):
 
 def get_openai_message(client, progress_percent, progress_change):
     if not OPENAI_AVAILABLE:
-        print("[DEBUG] OpenAI not available or API key/endpoint missing.")
         return None
     name = client["client_name"].split()[0]
     goal = client["goal_type"].lower()
@@ -48,25 +53,82 @@ def get_openai_message(client, progress_percent, progress_change):
         f"Use emojis, keep it under 2 sentences, and make it suitable for SMS. Add a text like from your finacial advisor Dave."
     )
     try:
-        response = openai.ChatCompletion.create(
-            engine=AZURE_OPENAI_DEPLOYMENT,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=60,
-            temperature=0.9,
-        )
-        msg = response.choices[0].message["content"].strip()
-        print("[DEBUG] OpenAI message generated.")
-        return msg
-    except Exception as e:
-        print(f"[DEBUG] OpenAI API call failed: {e}")
+        with span("llm", "goal_message"):
+            response = openai.ChatCompletion.create(
+                engine=AZURE_OPENAI_DEPLOYMENT,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=60,
+                temperature=0.9,
+                request_timeout=MESSAGE_LLM_TIMEOUT,
+            )
+        record_llm_usage("goal_message", response.get("usage"))
+        return response.choices[0].message["content"].strip()
+    except Exception:
+        # span() has already logged the failure
         return None
 
-def generate_message(client, progress_percent, progress_change):
-    # Try OpenAI first
+def get_openai_variants(goal_type, progress_change, band, count):
+    """
+    Raw completion text with up to `count` message templates, one per line, for the message pool;
+    None when the LLM is unavailable or the call fails.
+    """
+    if not OPENAI_AVAILABLE:
+        return None
+    prompt = (
+        f"You are a friendly financial assistant for Dave. Write {count} different short, motivational, text-friendly messages "
+        f"for a client about their {goal_type.lower()} goal. They are {band} of their goal. The progress this month has {progress_change}. "
+        f"Write {{name}} where the client's first name goes and {{percent}} where their progress percentage goes, e.g. '{{percent}}%'. "
+        f"Use emojis, keep each under 2 sentences, and make them suitable for SMS. Add a text like from your finacial advisor Dave. "
+        f"One message per line, no numbering."
+    )
+    try:
+        with span("llm", "pool_variants"):
+            response = openai.ChatCompletion.create(
+                engine=AZURE_OPENAI_DEPLOYMENT,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=60 * count,
+                temperature=0.9,
+                request_timeout=MESSAGE_POOL_LLM_TIMEOUT,
+            )
+        record_llm_usage("pool_variants", response.get("usage"))
+        return response.choices[0].message["content"]
+    except Exception:
+        return None
+
+def generate_message(client, progress_percent, progress_change, use_pool=True):
+    # Pre-generated variants first: an in-memory lookup, no LLM call on the update path
+    if use_pool:
+        pooled = pooled_message(client, progress_percent, progress_change)
+        if pooled:
+            return pooled
+    # Then a live completion
     ai_msg = get_openai_message(client, progress_percent, progress_change)
     if ai_msg:
+        messages_generated.inc(source="llm", reason="")
         return ai_msg
     # Fallback to templates
+    reason = "llm_error" if OPENAI_AVAILABLE else "llm_unavailable"
+    return template_fallback(client, progress_percent, progress_change, reason)
+
+def pooled_message(client, progress_percent, progress_change):
+    """
+    A message from the pre-generated pool, or None on a miss (which schedules a refill).
+    """
+    from message_pool import pool
+    message = pool.pick(client, progress_percent, progress_change)
+    if message:
+        messages_generated.inc(source="pool", reason="")
+    return message
+
+def template_fallback(client, progress_percent, progress_change, reason):
+    """
+    Template message counted (and timed) as a fallback, so the fallback rate shows on /metrics.
+    """
+    messages_generated.inc(source="template", reason=reason)
+    with span("template", reason):
+        return generate_template_message(client, progress_percent, progress_change)
+
+def generate_template_message(client, progress_percent, progress_change):
     name = client["client_name"].split()[0]
     goal = client["goal_type"].lower()
     last_message = client["last_message_sent"]
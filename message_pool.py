@@ -0,0 +1,289 @@
+"""
+Pool of pre-generated motivational message templates, so a goal update picks a message from memory
+instead of waiting on a chat completion.
+
+Messages are interchangeable across clients with the same goal type, change direction and progress
+band, so the LLM writes templates for each such key with {name} and {percent} slots. Templates live in
+the message_variants table (migration 0005) and are loaded into memory per worker. A key with fewer
+than MESSAGE_POOL_MIN_VARIANTS templates is refilled in a background thread, and a template is retired
+after MESSAGE_POOL_MAX_USES picks so messages keep changing. A miss returns None and the caller falls
+back to a live completion.
+"""
+import os
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from dotenv import load_dotenv
+from db import get_engine
+from metrics import span, log_event, message_pool_lookups
+from message_generator import get_openai_variants, OPENAI_AVAILABLE
+
+load_dotenv()
+
+MESSAGE_POOL_ENABLED = os.getenv("MESSAGE_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+MESSAGE_POOL_TARGET_VARIANTS = int(os.getenv("MESSAGE_POOL_TARGET_VARIANTS", "12"))
+MESSAGE_POOL_MIN_VARIANTS = int(os.getenv("MESSAGE_POOL_MIN_VARIANTS", "4"))
+# Picks per template across workers before it is retired; 0 keeps templates forever
+MESSAGE_POOL_MAX_USES = int(os.getenv("MESSAGE_POOL_MAX_USES", "50"))
+# Width of a progress band in percent; everything at or past 100% shares one band
+MESSAGE_POOL_BUCKET_SIZE = int(os.getenv("MESSAGE_POOL_BUCKET_SIZE", "25"))
+# Templates asked for per completion
+MESSAGE_POOL_BATCH_SIZE = int(os.getenv("MESSAGE_POOL_BATCH_SIZE", "6"))
+MESSAGE_POOL_REFILL_CONCURRENCY = int(os.getenv("MESSAGE_POOL_REFILL_CONCURRENCY", "2"))
+# A key that could not be filled (LLM down, unusable output) is not retried sooner than this
+MESSAGE_POOL_REFILL_BACKOFF_SECONDS = float(os.getenv("MESSAGE_POOL_REFILL_BACKOFF_SECONDS", "60"))
+
+CHANGES = ("increased", "same", "decreased")
+MAX_TEMPLATE_LENGTH = 320
+
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+_SLOT = re.compile(r"\{[^{}]*\}")
+
+KEY_VARIANTS_SQL = text("""
+    SELECT id, template, uses FROM message_variants
+    WHERE goal_type = :goal_type AND change_direction = :change AND progress_bucket = :bucket
+    ORDER BY id
+""")
+ALL_VARIANTS_SQL = text("SELECT id, goal_type, change_direction, progress_bucket, template, uses FROM message_variants")
+INSERT_VARIANTS_SQL = text("""
+    INSERT INTO message_variants (goal_type, change_direction, progress_bucket, template)
+    SELECT :goal_type, :change, :bucket, template FROM unnest(CAST(:templates AS text[])) AS t(template)
+    ON CONFLICT DO NOTHING
+""")
+ADD_USES_SQL = text("""
+    UPDATE message_variants v SET uses = v.uses + u.uses
+    FROM unnest(CAST(:ids AS integer[]), CAST(:uses AS integer[])) AS u(id, uses)
+    WHERE v.id = u.id
+""")
+RETIRE_SQL = text("""
+    DELETE FROM message_variants
+    WHERE goal_type = :goal_type AND change_direction = :change AND progress_bucket = :bucket AND uses >= :max_uses
+""")
+
+
+def progress_bucket(progress_percent, size=MESSAGE_POOL_BUCKET_SIZE):
+    if progress_percent >= 100:
+        return 100
+    return max(0, int(progress_percent // size) * size)
+
+
+def pool_key(goal_type, progress_change, progress_percent):
+    return (goal_type.strip().lower(), progress_change, progress_bucket(progress_percent))
+
+
+def describe_bucket(bucket, size=MESSAGE_POOL_BUCKET_SIZE):
+    if bucket >= 100:
+        return "at or past 100%"
+    return f"between {bucket}% and {min(bucket + size, 100)}%"
+
+
+def parse_templates(completion):
+    """
+    Usable templates from a completion: one per line, with both slots and no other braces.
+    """
+    templates = []
+    for line in (completion or "").splitlines():
+        line = _LIST_MARKER.sub("", line).strip().strip('"').strip()
+        if not line or len(line) > MAX_TEMPLATE_LENGTH:
+            continue
+        if "{name}" in line and "{percent}" in line and set(_SLOT.findall(line)) <= {"{name}", "{percent}"}:
+            templates.append(line)
+    return list(dict.fromkeys(templates))
+
+
+def fill(template, client, progress_percent):
+    # str.replace rather than format: the text came from the model
+    return template.replace("{name}", client["client_name"].split()[0]).replace("{percent}", f"{progress_percent:g}")
+
+
+def is_repeat(template, last_message):
+    """
+    True if last_message was written from this template, whatever name and percent filled it.
+    """
+    if not last_message:
+        return False
+    return all(part in last_message for part in _SLOT.split(template) if part.strip())
+
+
+class Variant:
+    __slots__ = ("id", "template", "uses")
+
+    def __init__(self, id, template, uses=0):
+        self.id = id
+        self.template = template
+        self.uses = uses
+
+
+class MessagePool:
+    """
+    In-memory templates per (goal_type, change, bucket), loaded from and refilled into message_variants.
+    pick() only touches memory; loading, retiring and generating happen on the refill threads.
+    """
+
+    def __init__(self, target=MESSAGE_POOL_TARGET_VARIANTS, minimum=MESSAGE_POOL_MIN_VARIANTS,
+                 max_uses=MESSAGE_POOL_MAX_USES, enabled=MESSAGE_POOL_ENABLED):
+        self.target = target
+        self.minimum = minimum
+        self.max_uses = max_uses
+        self.enabled = enabled
+        self._variants = {}
+        self._unflushed = {}  # variant id -> picks not yet added to message_variants.uses
+        self._pending = set()
+        self._next_refill = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MESSAGE_POOL_REFILL_CONCURRENCY, thread_name_prefix="message-pool")
+
+    def pick(self, client, progress_percent, progress_change):
+        """
+        A filled message for this client that isn't their last one, or None. Never blocks on I/O.
+        """
+        if not self.enabled:
+            return None
+        key = pool_key(client["goal_type"], progress_change, progress_percent)
+        last_message = client.get("last_message_sent")
+        with self._lock:
+            variants = self._variants.get(key, [])
+            fresh = [v for v in variants if not is_repeat(v.template, last_message)]
+            chosen = random.choice(fresh) if fresh else None
+            if chosen:
+                chosen.uses += 1
+                self._unflushed[chosen.id] = self._unflushed.get(chosen.id, 0) + 1
+                if self.max_uses and chosen.uses >= self.max_uses:
+                    variants.remove(chosen)
+            remaining = len(variants)
+        if remaining < self.minimum:
+            self.schedule_refill(key)
+        message_pool_lookups.inc(result="hit" if chosen else ("repeat" if variants else "empty"))
+        return fill(chosen.template, client, progress_percent) if chosen else None
+
+    def schedule_refill(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key in self._pending or now < self._next_refill.get(key, 0):
+                return False
+            self._pending.add(key)
+            self._next_refill[key] = now + MESSAGE_POOL_REFILL_BACKOFF_SECONDS
+        try:
+            self._executor.submit(self._refill_quietly, key)
+        except RuntimeError:
+            # Shutting down
+            with self._lock:
+                self._pending.discard(key)
+            return False
+        return True
+
+    def _refill_quietly(self, key):
+        try:
+            self.refill(key)
+        except Exception:
+            # span() has already logged the failure; the backoff spaces out retries
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def refill(self, key):
+        """
+        Record picks, retire worn-out templates, top the key up to the target and reload it.
+        Returns the number of templates now available for the key.
+        """
+        goal_type, change, bucket = key
+        params = {"goal_type": goal_type, "change": change, "bucket": bucket}
+        with span("message_pool", "refill", goal_type=goal_type, change=change, bucket=bucket) as fields:
+            self.flush_uses()
+            with get_engine().begin() as conn:
+                if self.max_uses:
+                    conn.execute(RETIRE_SQL, {**params, "max_uses": self.max_uses})
+                rows = conn.execute(KEY_VARIANTS_SQL, params).fetchall()
+            missing = self.target - len(rows) if OPENAI_AVAILABLE else 0
+            generated = 0
+            # One extra round covers completions that come back short or unusable
+            for _ in range(-(-missing // MESSAGE_POOL_BATCH_SIZE) + 1 if missing > 0 else 0):
+                count = min(MESSAGE_POOL_BATCH_SIZE, missing - generated)
+                if count <= 0:
+                    break
+                templates = parse_templates(get_openai_variants(goal_type, change, describe_bucket(bucket), count))[:count]
+                if templates:
+                    with get_engine().begin() as conn:
+                        generated += conn.execute(INSERT_VARIANTS_SQL, {**params, "templates": templates}).rowcount
+            if generated:
+                with get_engine().connect() as conn:
+                    rows = conn.execute(KEY_VARIANTS_SQL, params).fetchall()
+            self._load(key, rows)
+            fields.update(generated=generated, available=len(rows))
+        if len(rows) >= self.minimum:
+            with self._lock:
+                self._next_refill.pop(key, None)
+        return len(rows)
+
+    def _load(self, key, rows):
+        with self._lock:
+            self._variants[key] = [
+                Variant(row.id, row.template, row.uses + self._unflushed.get(row.id, 0))
+                for row in rows if not (self.max_uses and row.uses + self._unflushed.get(row.id, 0) >= self.max_uses)
+            ]
+
+    def flush_uses(self):
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, {}
+        if unflushed:
+            with get_engine().begin() as conn:
+                conn.execute(ADD_USES_SQL, {"ids": list(unflushed), "uses": list(unflushed.values())})
+
+    def load_all(self):
+        """
+        Load every stored template into memory; returns how many keys have templates.
+        """
+        grouped = {}
+        with get_engine().connect() as conn:
+            for row in conn.execute(ALL_VARIANTS_SQL):
+                grouped.setdefault((row.goal_type, row.change_direction, row.progress_bucket), []).append(row)
+        for key, rows in grouped.items():
+            self._load(key, rows)
+        return len(grouped)
+
+    def prefill(self):
+        """
+        Load stored templates, then queue refills for every goal type in use and every change and
+        band below the minimum. Returns the number of refills queued.
+        """
+        if not self.enabled:
+            return 0
+        self.load_all()
+        with get_engine().connect() as conn:
+            goal_types = {goal_type.strip().lower() for goal_type in conn.execute(text("SELECT DISTINCT goal_type FROM goals")).scalars()}
+        buckets = list(range(0, 100, MESSAGE_POOL_BUCKET_SIZE)) + [100]
+        queued = 0
+        for goal_type in sorted(goal_types):
+            for change in CHANGES:
+                for bucket in buckets:
+                    key = (goal_type, change, bucket)
+                    with self._lock:
+                        low = len(self._variants.get(key, [])) < self.minimum
+                    if low and self.schedule_refill(key):
+                        queued += 1
+        log_event("message_pool_prefill", logging.INFO, sample_rate=1, goal_types=len(goal_types), queued=queued)
+        return queued
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.flush_uses()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "keys": len(self._variants),
+                "variants": sum(len(v) for v in self._variants.values()),
+                "refilling": len(self._pending),
+            }
+
+
+pool = MessagePool()
@@ -0,0 +1,184 @@
+"""
+Lightweight instrumentation: timing spans, counters and histograms rendered in the Prometheus
+text format for /metrics, plus a sampled structured (JSON) log in place of debug prints.
+
+Recording a span or count is a lock and a few additions. Log lines are only formatted when the
+event is sampled, and warnings and errors are always logged.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_LOG_SAMPLE_RATE = float(os.getenv("METRICS_LOG_SAMPLE_RATE", "0.01"))
+METRICS_LOG_LEVEL = os.getenv("METRICS_LOG_LEVEL", "INFO").upper()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("advisor")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(METRICS_LOG_LEVEL)
+    logger.propagate = False
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        # Only the first bucket the value fits in is incremented; render() accumulates
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "advisor_stage_duration_seconds", "Time spent per stage (db, llm, embedding, retrieval, sms, ...).",
+    ["stage", "operation", "outcome"],
+))
+llm_tokens = registry.register(Counter(
+    "advisor_llm_tokens_total", "Tokens reported by Azure OpenAI, by call purpose and kind.", ["purpose", "kind"],
+))
+messages_generated = registry.register(Counter(
+    "advisor_messages_generated_total", "Motivational messages by source; template means the LLM was skipped or failed.",
+    ["source", "reason"],
+))
+message_pool_lookups = registry.register(Counter(
+    "advisor_message_pool_lookups_total", "Message pool lookups: hit, empty (no templates yet) or repeat (only the last message left).",
+    ["result"],
+))
+sms_sends = registry.register(Counter(
+    "advisor_sms_sends_total", "SMS send attempts by result (sent, retried, failed).", ["result"],
+))
+
+
+def log_event(event, level=logging.INFO, sample_rate=None, **fields):
+    """
+    One JSON log line. INFO and below are sampled at METRICS_LOG_SAMPLE_RATE unless sample_rate is given.
+    """
+    if level < logging.WARNING:
+        rate = METRICS_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        if rate < 1 and random.random() >= rate:
+            return
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, json.dumps({"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(),
+                                  "event": event, **fields}, default=str))
+
+
+@contextmanager
+def span(stage, operation="", **fields):
+    """
+    Time a block into advisor_stage_duration_seconds. Yields a dict that the block can add log fields to.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield fields
+    except BaseException as e:
+        outcome = "error"
+        fields["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage, operation=operation, outcome=outcome)
+        log_event(stage, logging.WARNING if outcome == "error" else logging.INFO,
+                  operation=operation, outcome=outcome, duration_ms=round(elapsed * 1000, 2), **fields)
+
+
+def record_llm_usage(purpose, usage):
+    """
+    Count prompt/completion tokens from an OpenAI-style usage mapping (missing keys are skipped).
+    """
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind) if hasattr(usage, "get") else getattr(usage, kind, None)
+        if value:
+            llm_tokens.inc(value, purpose=purpose, kind=kind.replace("_tokens", ""))
+
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,147 @@
+"""
+Versioned schema migrations on top of init_db.sql.
+
+    python migrate.py                  # apply pending migrations
+    python migrate.py --status         # list applied / pending
+    python migrate.py --include 0003   # also apply an optional migration (e.g. monthly partitioning)
+
+Migrations are migrations/NNNN_name.sql, applied in order, each in its own transaction, and
+recorded in schema_migrations with a checksum. Files starting with "-- optional" are skipped
+unless named with --include.
+"""
+import os
+import re
+import sys
+import hashlib
+import argparse
+from datetime import datetime
+from sqlalchemy import text
+from dotenv import load_dotenv
+from db import get_engine
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.getenv("MIGRATIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations"))
+# With goal_history partitioned, keep this many months of partitions created ahead
+PARTITION_MONTHS_AHEAD = int(os.getenv("MIGRATE_PARTITION_MONTHS_AHEAD", "12"))
+
+MIGRATION_LOCK_KEY = 815_001
+MIGRATION_FILE = re.compile(r"^(?P<version>\d{4})_(?P<name>[a-z0-9_]+)\.sql$")
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append({
+            "version": match.group("version"),
+            "name": match.group("name"),
+            "sql": sql,
+            "checksum": hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+            "optional": sql.lstrip().lower().startswith("-- optional"),
+        })
+    return migrations
+
+
+def _ensure_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+def applied_migrations(conn):
+    _ensure_table(conn)
+    return {row.version: row for row in conn.execute(text("SELECT version, name, checksum, applied_at FROM schema_migrations"))}
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create upcoming monthly goal_history partitions if the table is partitioned; returns how many were created.
+    """
+    if conn.execute(text("SELECT to_regproc('create_goal_history_partitions') IS NOT NULL")).scalar():
+        return conn.execute(text("""
+            SELECT create_goal_history_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => :months))::date)
+        """), {"months": months_ahead}).scalar()
+    return 0
+
+
+def migrate(include=(), engine=None):
+    """
+    Apply pending migrations in version order; returns the versions applied.
+    """
+    engine = engine or get_engine()
+    include = set(include)
+    with engine.connect() as lock_conn:
+        # Several app containers may start at once; only one migrates at a time
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            return _apply_pending(engine, include)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def _apply_pending(engine, include):
+    with engine.begin() as conn:
+        applied = applied_migrations(conn)
+    done = []
+    for migration in load_migrations():
+        version = migration["version"]
+        if version in applied:
+            if applied[version].checksum != migration["checksum"]:
+                print(f"[WARN] Migration {version}_{migration['name']} changed after it was applied")
+            continue
+        if migration["optional"] and version not in include:
+            continue
+        started = datetime.now()
+        with engine.begin() as conn:
+            # Whole file in one call on the raw cursor: psycopg2 runs multi-statement scripts as-is,
+            # and without parameters it leaves % in the SQL alone
+            with conn.connection.cursor() as cursor:
+                cursor.execute(migration["sql"])
+            conn.execute(text("""
+                INSERT INTO schema_migrations (version, name, checksum) VALUES (:version, :name, :checksum)
+            """), {key: migration[key] for key in ("version", "name", "checksum")})
+        print(f"Applied {version}_{migration['name']} in {(datetime.now() - started).total_seconds():.2f}s")
+        done.append(version)
+    with engine.begin() as conn:
+        created = ensure_partitions(conn)
+    if created:
+        print(f"Created {created} goal_history partitions")
+    return done
+
+
+def print_status(engine=None):
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        applied = applied_migrations(conn)
+    for migration in load_migrations():
+        row = applied.get(migration["version"])
+        if row:
+            state = f"applied {row.applied_at:%Y-%m-%d %H:%M}"
+            if row.checksum != migration["checksum"]:
+                state += " (file changed since)"
+        else:
+            state = "pending (optional)" if migration["optional"] else "pending"
+        print(f"{migration['version']}_{migration['name']}: {state}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations")
+    parser.add_argument("--include", action="append", default=[], metavar="VERSION", help="Optional migration to apply")
+    args = parser.parse_args()
+    if args.status:
+        print_status()
+        sys.exit(0)
+    applied = migrate(include=args.include)
+    if not applied:
+        print("Schema is up to date.")
@@ -0,0 +1,7 @@
+-- Per-goal history reads (ordered by time, latest first or last) and client -> goals lookups
+-- were sequential scans. Amount columns are included so history pages can be served from the index.
+CREATE INDEX IF NOT EXISTS goal_history_goal_id_created_at_idx
+    ON goal_history (goal_id, created_at, id) INCLUDE (goal_amount, current_amount);
+
+CREATE INDEX IF NOT EXISTS goals_client_id_idx
+    ON goals (client_id) INCLUDE (goal_type);
@@ -0,0 +1,111 @@
+-- One row per goal with its latest history entry, kept current by a trigger on goal_history,
+-- so "latest message / latest progress" lookups never scan history.
+CREATE TABLE IF NOT EXISTS goal_progress_latest (
+    goal_id INTEGER PRIMARY KEY REFERENCES goals(id) ON DELETE CASCADE,
+    history_id INTEGER NOT NULL,
+    history_count INTEGER NOT NULL,
+    goal_amount NUMERIC NOT NULL,
+    current_amount NUMERIC NOT NULL,
+    previous_amount NUMERIC,
+    progress_percent NUMERIC,
+    -- Same vocabulary as message_generator.detect_progress_change; NULL for a goal's first entry
+    change_direction VARCHAR(10),
+    last_message_sent TEXT,
+    created_at TIMESTAMP,
+    -- When the row last changed (including a message filled in later); drives vector sync
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS goal_progress_latest_updated_at_idx ON goal_progress_latest (updated_at);
+
+CREATE OR REPLACE FUNCTION goal_progress_percent(current_amount NUMERIC, goal_amount NUMERIC)
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN goal_amount > 0 THEN round(current_amount / goal_amount * 100, 1) END
+$$;
+
+CREATE OR REPLACE FUNCTION goal_change_direction(current_amount NUMERIC, previous_amount NUMERIC)
+RETURNS VARCHAR LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN previous_amount IS NULL THEN NULL
+        WHEN current_amount > previous_amount THEN 'increased'
+        WHEN current_amount = previous_amount THEN 'same'
+        ELSE 'decreased'
+    END
+$$;
+
+CREATE OR REPLACE FUNCTION goal_history_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.goal_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        UPDATE goal_progress_latest
+        SET goal_amount = NEW.goal_amount,
+            current_amount = NEW.current_amount,
+            progress_percent = goal_progress_percent(NEW.current_amount, NEW.goal_amount),
+            change_direction = goal_change_direction(NEW.current_amount, previous_amount),
+            last_message_sent = NEW.last_message_sent,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE goal_id = NEW.goal_id AND history_id = NEW.id;
+        RETURN NULL;
+    END IF;
+    INSERT INTO goal_progress_latest AS l (
+        goal_id, history_id, history_count, goal_amount, current_amount, previous_amount,
+        progress_percent, change_direction, last_message_sent, created_at, updated_at
+    ) VALUES (
+        NEW.goal_id, NEW.id, 1, NEW.goal_amount, NEW.current_amount, NULL,
+        goal_progress_percent(NEW.current_amount, NEW.goal_amount), NULL,
+        NEW.last_message_sent, NEW.created_at, CURRENT_TIMESTAMP
+    )
+    ON CONFLICT (goal_id) DO UPDATE SET
+        history_count = l.history_count + 1,
+        history_id = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id) THEN NEW.id ELSE l.history_id END,
+        goal_amount = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id) THEN NEW.goal_amount ELSE l.goal_amount END,
+        current_amount = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id) THEN NEW.current_amount ELSE l.current_amount END,
+        previous_amount = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id) THEN l.current_amount ELSE l.previous_amount END,
+        progress_percent = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id)
+            THEN goal_progress_percent(NEW.current_amount, NEW.goal_amount) ELSE l.progress_percent END,
+        change_direction = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id)
+            THEN goal_change_direction(NEW.current_amount, l.current_amount) ELSE l.change_direction END,
+        last_message_sent = CASE WHEN (NEW.created_at, NEW.id) >= (l.created_at, l.history_id) THEN NEW.last_message_sent ELSE l.last_message_sent END,
+        created_at = GREATEST(NEW.created_at, l.created_at),
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END
+$$;
+
+-- Full rebuild from history; used for the backfill below and after bulk loads with the trigger disabled
+CREATE OR REPLACE FUNCTION refresh_goal_progress_latest() RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    DELETE FROM goal_progress_latest;
+    INSERT INTO goal_progress_latest (
+        goal_id, history_id, history_count, goal_amount, current_amount, previous_amount,
+        progress_percent, change_direction, last_message_sent, created_at, updated_at
+    )
+    SELECT goal_id, id, history_count, goal_amount, current_amount, previous_amount,
+           goal_progress_percent(current_amount, goal_amount),
+           goal_change_direction(current_amount, previous_amount),
+           last_message_sent, created_at, COALESCE(created_at, CURRENT_TIMESTAMP)
+    FROM (
+        SELECT h.*,
+               lag(current_amount) OVER w AS previous_amount,
+               count(*) OVER (PARTITION BY goal_id) AS history_count,
+               row_number() OVER (PARTITION BY goal_id ORDER BY created_at DESC NULLS LAST, id DESC) AS recency
+        FROM goal_history h
+        WHERE goal_id IS NOT NULL
+        WINDOW w AS (PARTITION BY goal_id ORDER BY created_at NULLS FIRST, id)
+    ) ranked
+    WHERE recency = 1;
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END
+$$;
+
+DROP TRIGGER IF EXISTS goal_history_rollup ON goal_history;
+CREATE TRIGGER goal_history_rollup
+    AFTER INSERT OR UPDATE ON goal_history
+    FOR EACH ROW EXECUTE FUNCTION goal_history_rollup();
+
+SELECT refresh_goal_progress_latest();
@@ -0,0 +1,67 @@
+-- optional
+-- Rebuilds goal_history as a table range-partitioned by month of created_at, so old months can be
+-- detached/archived and time-bounded scans only touch the months they need. Apply with
+-- `python migrate.py --include 0003`; migrate.py then keeps partitions created ahead of time.
+-- Per-goal reads now probe every partition's index, so this only pays off with long retention.
+UPDATE goal_history SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+
+ALTER TABLE goal_history RENAME TO goal_history_unpartitioned;
+ALTER INDEX goal_history_pkey RENAME TO goal_history_unpartitioned_pkey;
+ALTER INDEX IF EXISTS goal_history_goal_id_created_at_idx RENAME TO goal_history_unpartitioned_goal_id_created_at_idx;
+
+CREATE TABLE goal_history (
+    id INTEGER NOT NULL DEFAULT nextval('goal_history_id_seq'),
+    goal_id INTEGER REFERENCES goals(id),
+    goal_amount NUMERIC NOT NULL,
+    current_amount NUMERIC NOT NULL,
+    last_message_sent TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches anything outside the pre-created months so inserts never fail
+CREATE TABLE goal_history_default PARTITION OF goal_history DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_goal_history_partitions(from_month DATE, to_month DATE)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        partition_name := format('goal_history_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF goal_history FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END
+$$;
+
+SELECT create_goal_history_partitions(
+    COALESCE((SELECT min(created_at) FROM goal_history_unpartitioned), CURRENT_TIMESTAMP)::date,
+    (CURRENT_TIMESTAMP + INTERVAL '12 months')::date
+);
+
+INSERT INTO goal_history (id, goal_id, goal_amount, current_amount, last_message_sent, created_at)
+SELECT id, goal_id, goal_amount, current_amount, last_message_sent, created_at FROM goal_history_unpartitioned;
+
+-- Keep the sequence when the old table goes
+ALTER SEQUENCE goal_history_id_seq OWNED BY goal_history.id;
+DROP TABLE goal_history_unpartitioned;
+
+CREATE INDEX goal_history_goal_id_created_at_idx
+    ON goal_history (goal_id, created_at, id) INCLUDE (goal_amount, current_amount);
+
+CREATE TRIGGER goal_history_rollup
+    AFTER INSERT OR UPDATE ON goal_history
+    FOR EACH ROW EXECUTE FUNCTION goal_history_rollup();
+
+-- The new table starts without planner statistics
+ANALYZE goal_history;
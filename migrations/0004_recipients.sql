@@ -0,0 +1,13 @@
+-- SMS recipients, previously a per-process dict in the API. One row per phone number (E.164),
+-- owned by a client, or by no client for the advisor's general broadcast list.
+CREATE TABLE IF NOT EXISTS recipients (
+    phone_number VARCHAR(16) PRIMARY KEY,
+    client_id INTEGER REFERENCES clients(id) ON DELETE CASCADE,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Sends look up the active numbers of one client
+CREATE INDEX IF NOT EXISTS recipients_client_id_idx
+    ON recipients (client_id) INCLUDE (phone_number) WHERE active;
@@ -0,0 +1,14 @@
+-- Pre-generated motivational message templates, shared by every worker. One pool per goal type
+-- (lowercased), change direction and progress bucket; templates hold {name} and {percent} slots.
+CREATE TABLE IF NOT EXISTS message_variants (
+    id SERIAL PRIMARY KEY,
+    goal_type VARCHAR(50) NOT NULL,
+    -- Same vocabulary as message_generator.detect_progress_change
+    change_direction VARCHAR(10) NOT NULL,
+    -- Lower bound of the progress band, in percent (100 means reached or passed)
+    progress_bucket SMALLINT NOT NULL,
+    template TEXT NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (goal_type, change_direction, progress_bucket, template)
+);
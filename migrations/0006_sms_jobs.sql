@@ -0,0 +1,22 @@
+-- SMS job progress, previously only in the memory of the worker that queued the job, so a poll
+-- that landed on another worker got 404. The queuing worker writes each result as it lands.
+CREATE TABLE IF NOT EXISTS sms_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    status VARCHAR(16) NOT NULL,
+    total INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP
+);
+
+-- Retention deletes finished jobs by age
+CREATE INDEX IF NOT EXISTS sms_jobs_finished_at_idx ON sms_jobs (finished_at);
+
+CREATE TABLE IF NOT EXISTS sms_job_results (
+    job_id VARCHAR(32) NOT NULL REFERENCES sms_jobs(id) ON DELETE CASCADE,
+    phone_number VARCHAR(16) NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    sid TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (job_id, phone_number)
+);
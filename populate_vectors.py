@@ -1,8 +1,8 @@
-from rag_utils import get_all_goal_history_chunks, ingest_chunks_to_langchain_chroma
+import sys
+from vector_sync import sync_vector_index
 
 if __name__ == "__main__":
-    print("Extracting all goal history chunks...")
-    chunks = get_all_goal_history_chunks()
-    print(f"Found {len(chunks)} chunks. Ingesting into LangChain Chroma...")
-    ingest_chunks_to_langchain_chroma(chunks)
-    print("LangChain Chroma vector DB populated successfully.") 
\ No newline at end of file
+    full = "--full" in sys.argv
+    print("Full rebuild of goal history chunks..." if full else "Syncing changed goal history chunks...")
+    count = sync_vector_index(full=full)
+    print(f"Upserted {count} chunks into LangChain Chroma vector DB.")
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def _as_arrays(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount):
+    return (
+        np.asarray(current_amount, dtype=np.float64),
+        np.asarray(monthly_contribution, dtype=np.float64),
+        np.asarray(withdrawal_period_months, dtype=np.float64),
+        np.asarray(expected_return_rate, dtype=np.float64) / 12,
+        np.asarray(goal_amount, dtype=np.float64),
+    )
+
+
+def _annuity_factor(r, n):
+    """
+    ((1 + r)^n - 1) / r, falling back to n where the monthly rate is zero.
+    """
+    growth = np.power(1 + r, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(r == 0, n, (growth - 1) / np.where(r == 0, 1, r))
+    return growth, factor
+
+
+def project_goals(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount):
+    """
+    Evaluate the compound-growth projection for many goals at once.
+    Every argument is a scalar or an array with one entry per goal.
+    Returns a dict of arrays: future_value, on_track, shortfall and
+    required_monthly_contribution (to reach goal_amount by the end of the period).
+    """
+    P, PMT, n, r, goal = _as_arrays(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount)
+    growth, factor = _annuity_factor(r, n)
+    future_value = P * growth + PMT * factor
+    shortfall = np.maximum(goal - future_value, 0.0)
+    # With no months left the whole gap has to be covered now
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required = np.where(factor > 0, (goal - P * growth) / np.where(factor > 0, factor, 1), goal - P)
+    return {
+        "future_value": future_value,
+        "on_track": future_value >= goal,
+        "shortfall": shortfall,
+        "required_monthly_contribution": np.maximum(required, 0.0),
+    }
+
+
+def projection_curves(current_amount, monthly_contribution, expected_return_rate, horizon_months):
+    """
+    Month-by-month projected balance for each goal, as a (goals x horizon_months + 1)
+    array whose first column is today's balance.
+    """
+    P = np.asarray(current_amount, dtype=np.float64)[:, None]
+    PMT = np.asarray(monthly_contribution, dtype=np.float64)[:, None]
+    r = (np.asarray(expected_return_rate, dtype=np.float64) / 12)[:, None]
+    months = np.arange(horizon_months + 1, dtype=np.float64)[None, :]
+    growth, factor = _annuity_factor(r, months)
+    return P * growth + PMT * factor
+
+
+def is_goal_on_track(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount):
+    return bool(project_goals(current_amount, monthly_contribution, withdrawal_period_months, expected_return_rate, goal_amount)["on_track"])
@@ -0,0 +1,49 @@
+"""
+LangChain adapters over the shared embedding and retrieval caches.
+Kept out of langchain_rag so the LangChain imports only happen when the pipeline is built.
+"""
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from embeddings import EmbeddingCache, EMBEDDING_DEPLOYMENT, embed_texts, embed_query
+from metrics import span
+from chat_cache import query_embedding_cache, retrieval_cache, normalize_question, tags_for_documents
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by embed_texts, so the vector store shares the batching and cache.
+    Queries skip the disk cache and are only cached in memory.
+    """
+
+    def __init__(self, deployment=None):
+        self.deployment = deployment or EMBEDDING_DEPLOYMENT
+
+    def embed_documents(self, texts):
+        return embed_texts(list(texts), self.deployment)
+
+    def embed_query(self, text):
+        key = EmbeddingCache.key(normalize_question(text), self.deployment)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = embed_query(text, self.deployment)
+            query_embedding_cache.set(key, vector)
+        return vector
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Wraps a retriever and caches its results per normalized query, tagged by client/goal.
+    scope_key separates the cache entries of retrievers with different metadata filters.
+    """
+    retriever: BaseRetriever
+    scope_key: str = ""
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        key = f"{self.scope_key}|{normalize_question(query)}"
+        docs = retrieval_cache.get(key)
+        if docs is None:
+            with span("retrieval", "scoped" if self.scope_key else "vectorstore") as fields:
+                docs = self.retriever.invoke(query)
+                fields["documents"] = len(docs)
+            retrieval_cache.set(key, docs, tags_for_documents(docs))
+        return docs
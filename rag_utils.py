@@ -1,22 +1,14 @@
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import openai
-import chromadb
 from dotenv import load_dotenv
-from langchain.schema import Document
+from db import get_engine
+from embeddings import embed_texts, embed_query, count_tokens
+from metrics import span, log_event
+from vector_store import COLLECTION_NAME, get_collection, batches
 
 load_dotenv()
 
-DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    # Fallback to manual construction for compatibility
-    DB_HOST = os.getenv('DB_HOST', 'localhost')
-    DB_PORT = os.getenv('DB_PORT', '5432')
-    DB_NAME = os.getenv('DB_NAME', 'investment_db')
-    DB_USER = os.getenv('DB_USER', 'user')
-    DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
-    DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
 # OpenAI config
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 AZURE_OPENAI_VERSION = os.getenv("AZURE_OPENAI_VERSION", "2023-05-15")
@@ -28,97 +20,229 @@ openai.api_key = os.getenv("AZURE_OPENAI_KEY")
 # Embedding deployment name
 EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
-# Chroma client
-chroma_client = chromadb.Client()
-COLLECTION_NAME = "goals_with_history"
+# Goal chunking: token ceiling per chunk, history period per chunk (quarter, month or year),
+# and how many recent updates the per-goal summary chunk repeats
+RAG_CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", "300"))
+RAG_HISTORY_BUCKET = os.getenv("RAG_HISTORY_BUCKET", "quarter").lower()
+RAG_SUMMARY_RECENT_ENTRIES = int(os.getenv("RAG_SUMMARY_RECENT_ENTRIES", "3"))
+
+
+def _history_bucket(day):
+    if RAG_HISTORY_BUCKET == "month":
+        return f"{day.year}-{day.month:02d}"
+    if RAG_HISTORY_BUCKET == "year":
+        return str(day.year)
+    return f"{day.year}Q{(day.month - 1) // 3 + 1}"
+
+
+def _clip(text_value, max_tokens):
+    # Trim a single oversized line to the ceiling (~4 characters per token)
+    while count_tokens(text_value) > max_tokens and len(text_value) > 16:
+        text_value = text_value[:int(len(text_value) * 0.8)].rsplit(" ", 1)[0] + " ..."
+    return text_value
+
+
+def _pack_lines(header, lines, max_tokens):
+    """
+    Greedily pack lines under header into texts of at most max_tokens tokens each.
+    Returns a list of (text, lines_in_text) pairs.
+    """
+    header_tokens = count_tokens(header)
+    budget = max(max_tokens - header_tokens, 16)
+    parts, current, used = [], [], 0
+    for line in lines:
+        line = _clip(line, budget)
+        tokens = count_tokens(line) + 1
+        if current and used + tokens > budget:
+            parts.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+    if current:
+        parts.append(current)
+    return [(header + "\n" + "\n".join(part), part) for part in parts]
+
+
+def _trend_lines(history):
+    """
+    Trend statistics over a goal's full history, as summary lines.
+    """
+    first, last = history[0], history[-1]
+    changes = [b.current_amount - a.current_amount for a, b in zip(history, history[1:])]
+    months = max((last.created_at.year - first.created_at.year) * 12 + last.created_at.month - first.created_at.month, 1)
+    lines = [
+        f"History: {len(history)} updates from {first.created_at.date()} to {last.created_at.date()}",
+        f"Change since first update: ${last.current_amount - first.current_amount:+,.2f} "
+        f"(average ${(last.current_amount - first.current_amount) / months:+,.2f} per month)",
+    ]
+    if changes:
+        line = (f"Updates: {sum(1 for c in changes if c > 0)} increased, {sum(1 for c in changes if c == 0)} unchanged, "
+                f"{sum(1 for c in changes if c < 0)} decreased")
+        if max(changes) > 0:
+            line += f"; largest rise ${max(changes):+,.2f}"
+        if min(changes) < 0:
+            line += f"; largest drop ${min(changes):+,.2f}"
+        lines.append(line)
+    return lines
+
+
+def _history_line(entry, include_message=True):
+    line = f"- {entry.created_at.date()}: ${entry.current_amount} (Goal: ${entry.goal_amount})"
+    if include_message and entry.last_message_sent:
+        line += f' - "{entry.last_message_sent}"'
+    return line
+
+
+def build_goal_chunks(conn, goal_ids=None, max_tokens=None):
+    """
+    Build bounded chunks per goal: one summary chunk (current state, trend stats, recent window)
+    and one chunk per history period (RAG_HISTORY_BUCKET, quarter by default), split further if a
+    period exceeds the token ceiling.
+    goal_ids restricts the rebuild to those goals; None means every goal.
+    Latest progress comes from the goal_progress_latest rollup; history is read in one indexed pass.
+    Returns a list of dicts: {goal_id, client_id, part, text, metadata}
+    """
+    max_tokens = max_tokens or RAG_CHUNK_MAX_TOKENS
+    params = {"goal_ids": list(goal_ids) if goal_ids is not None else None}
+    goals = conn.execute(text("""
+        SELECT g.id as goal_id, c.id as client_id, c.client_name, g.goal_type, g.goal_amount, g.initial_amount, g.current_amount, g.monthly_contribution, g.withdrawal_period_months, g.expected_return_rate,
+               l.progress_percent, l.change_direction
+        FROM goals g
+        JOIN clients c ON g.client_id = c.id
+        LEFT JOIN goal_progress_latest l ON l.goal_id = g.id
+        WHERE CAST(:goal_ids AS integer[]) IS NULL OR g.id = ANY(CAST(:goal_ids AS integer[]))
+    """), params).fetchall()
+    history_by_goal = {}
+    history_result = conn.execute(text("""
+        SELECT goal_id, goal_amount, current_amount, last_message_sent, created_at
+        FROM goal_history
+        WHERE CAST(:goal_ids AS integer[]) IS NULL OR goal_id = ANY(CAST(:goal_ids AS integer[]))
+        ORDER BY goal_id, created_at, id
+    """), params)
+    for h in history_result:
+        history_by_goal.setdefault(h.goal_id, []).append(h)
+    chunks = []
+    for goal in goals:
+        history = history_by_goal.get(goal.goal_id, [])
+        header = f"Client: {goal.client_name}\nGoal: {goal.goal_type}"
+        progress = ""
+        if goal.progress_percent is not None:
+            progress = f"Progress: {goal.progress_percent}% of target"
+            if goal.change_direction:
+                progress += f" ({goal.change_direction} since the previous update)"
+            progress += "\n"
+        summary = (
+            f"{header}\n"
+            f"Target: ${goal.goal_amount}\n"
+            f"Initial: ${goal.initial_amount}\n"
+            f"Current: ${goal.current_amount}\n"
+            f"{progress}"
+            f"Monthly Contribution: ${goal.monthly_contribution}\n"
+            f"Withdrawal Period: {goal.withdrawal_period_months} months\n"
+            f"Expected Return: {goal.expected_return_rate*100:.2f}%"
+        )
+        metadata = {"chunk_type": "goal_summary"}
+        if history:
+            recent = history[-RAG_SUMMARY_RECENT_ENTRIES:]
+            lines = _trend_lines(history) + ["Recent updates:"] + [_history_line(h, include_message=False) for h in recent[:-1]]
+            # Only the latest message is kept here; older ones live in the period chunks
+            lines.append(_history_line(recent[-1]))
+            summary += "\n" + "\n".join(lines)
+            metadata.update(period_start=str(history[0].created_at.date()), period_end=str(history[-1].created_at.date()))
+        chunks.append({
+            "goal_id": goal.goal_id,
+            "client_id": goal.client_id,
+            "part": "summary",
+            "text": _clip(summary, max_tokens),
+            "metadata": metadata,
+        })
+
+        periods = {}
+        for h in history:
+            periods.setdefault(_history_bucket(h.created_at), []).append(h)
+        for period, entries in periods.items():
+            packed = _pack_lines(f"{header}\nHistory for {period}:", [_history_line(h) for h in entries], max_tokens)
+            offset = 0
+            for index, (chunk_text, lines) in enumerate(packed):
+                part_entries = entries[offset:offset + len(lines)]
+                offset += len(lines)
+                chunks.append({
+                    "goal_id": goal.goal_id,
+                    "client_id": goal.client_id,
+                    "part": period if len(packed) == 1 else f"{period}-{index + 1}",
+                    "text": chunk_text,
+                    "metadata": {
+                        "chunk_type": "goal_history",
+                        "period": period,
+                        "period_start": str(part_entries[0].created_at.date()),
+                        "period_end": str(part_entries[-1].created_at.date()),
+                    },
+                })
+    return chunks
+
+
+def build_client_summary_chunk(conn):
+    """
+    Build the summary chunk with client count and names, with keyword-rich and question-like phrasing.
+    """
+    result = conn.execute(text("SELECT client_name FROM clients ORDER BY client_name"))
+    client_names = [row.client_name for row in result]
+    client_count = len(client_names)
+    return {
+        "goal_id": "summary",
+        "client_id": "summary",
+        "text": (
+            f"Client summary: There are {client_count} clients in the system. "
+            f"Client names: {', '.join(client_names)}. "
+            f"Total number of clients: {client_count}. "
+            f"Number of clients: {client_count}. "
+            f"How many clients do I have? You have {client_count} clients. "
+            f"How many clients are there? There are {client_count} clients. "
+            f"What is the client count? {client_count}. "
+            f"List of all clients: {', '.join(client_names)}. "
+            f"Use this information to answer questions about the number of clients, client count, or client list."
+        )
+    }
 
 
 def get_all_goal_history_chunks():
     """
-    Extract all goals and their full history for all clients, and build summary text chunks.
-    Returns a list of dicts: {goal_id, client_id, text}
+    Extract all goals and their history for all clients, and build the bounded goal chunks
+    plus the client summary chunk.
+    Returns a list of dicts: {goal_id, client_id, part, text, metadata}
     """
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     with engine.connect() as conn:
-        goals_result = conn.execute(text("""
-            SELECT g.id as goal_id, c.id as client_id, c.client_name, g.goal_type, g.goal_amount, g.initial_amount, g.current_amount, g.monthly_contribution, g.withdrawal_period_months, g.expected_return_rate
-            FROM goals g
-            JOIN clients c ON g.client_id = c.id
-        """))
-        chunks = []
-        for goal in goals_result:
-            history_result = conn.execute(text("""
-                SELECT goal_amount, current_amount, last_message_sent, created_at
-                FROM goal_history
-                WHERE goal_id = :goal_id
-                ORDER BY created_at
-            """), {"goal_id": goal.goal_id})
-            history_lines = []
-            for h in history_result:
-                history_lines.append(
-                    f"- {h.created_at.date()}: ${h.current_amount} (Goal: ${h.goal_amount}) - \"{h.last_message_sent}\""
-                )
-            history_str = "\n".join(history_lines)
-            summary = (
-                f"Client: {goal.client_name}\n"
-                f"Goal: {goal.goal_type}\n"
-                f"Target: ${goal.goal_amount}\n"
-                f"Initial: ${goal.initial_amount}\n"
-                f"Current: ${goal.current_amount}\n"
-                f"Monthly Contribution: ${goal.monthly_contribution}\n"
-                f"Withdrawal Period: {goal.withdrawal_period_months} months\n"
-                f"Expected Return: {goal.expected_return_rate*100:.2f}%\n"
-                f"History:\n{history_str}"
-            )
-            chunks.append({
-                "goal_id": goal.goal_id,
-                "client_id": goal.client_id,
-                "text": summary
-            })
-        # Add a summary chunk with client count and names, with keyword-rich and question-like phrasing
-        result = conn.execute(text("SELECT client_name FROM clients ORDER BY client_name"))
-        client_names = [row.client_name for row in result]
-        client_count = len(client_names)
-        summary_chunk = {
-            "goal_id": "summary",
-            "client_id": "summary",
-            "text": (
-                f"Client summary: There are {client_count} clients in the system. "
-                f"Client names: {', '.join(client_names)}. "
-                f"Total number of clients: {client_count}. "
-                f"Number of clients: {client_count}. "
-                f"How many clients do I have? You have {client_count} clients. "
-                f"How many clients are there? There are {client_count} clients. "
-                f"What is the client count? {client_count}. "
-                f"List of all clients: {', '.join(client_names)}. "
-                f"Use this information to answer questions about the number of clients, client count, or client list."
-            )
-        }
-        chunks.append(summary_chunk)
+        chunks = build_goal_chunks(conn)
+        chunks.append(build_client_summary_chunk(conn))
     return chunks
 
 
+def chunk_id(chunk):
+    base = f"{chunk['client_id']}_{chunk['goal_id']}"
+    return f"{base}_{chunk['part']}" if chunk.get("part") else base
+
+
+def chunk_metadata(chunk):
+    return {"goal_id": chunk["goal_id"], "client_id": chunk["client_id"], **chunk.get("metadata", {})}
+
+
 def embed_and_store_chunks(chunks):
     """
-    Embed each chunk using OpenAI and store in Chroma DB.
-    """
-    collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
-    for chunk in chunks:
-        embedding = openai.Embedding.create(
-            input=chunk["text"],
-            engine=EMBEDDING_DEPLOYMENT
-        )["data"][0]["embedding"]
-        collection.add(
-            ids=[f"{chunk['client_id']}_{chunk['goal_id']}"],
-            embeddings=[embedding],
-            documents=[chunk["text"]],
-            metadatas=[{"goal_id": chunk["goal_id"], "client_id": chunk["client_id"]}]
+    Embed chunks in batches (through the embedding cache) and upsert them into Chroma DB, in as few
+    calls as Chroma's maximum batch size allows.
+    """
+    if not chunks:
+        return
+    collection = get_collection()
+    for batch in batches(chunks):
+        collection.upsert(
+            ids=[chunk_id(chunk) for chunk in batch],
+            embeddings=embed_texts([chunk["text"] for chunk in batch], EMBEDDING_DEPLOYMENT),
+            documents=[chunk["text"] for chunk in batch],
+            metadatas=[chunk_metadata(chunk) for chunk in batch]
         )
-    # Debug: print all documents in the collection
-    all_docs = collection.get()
-    print("[DEBUG] All documents in Chroma collection:")
-    for doc in all_docs['documents']:
-        print(doc)
+    log_event("chunks_stored", chunks=len(chunks), collection=COLLECTION_NAME)
 
 
 def retrieve_relevant_chunks(user_question, n_results=5):
@@ -126,25 +250,38 @@ def retrieve_relevant_chunks(user_question, n_results=5):
     Embed the user question and retrieve the most relevant chunks from Chroma DB.
     Returns a list of chunk texts.
     """
-    collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
-    query_embedding = openai.Embedding.create(
-        input=user_question,
-        engine=EMBEDDING_DEPLOYMENT
-    )["data"][0]["embedding"]
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
-    print("[DEBUG] User question:", user_question)
-    print("[DEBUG] Retrieved documents:", results["documents"])
+    collection = get_collection()
+    query_embedding = embed_query(user_question, EMBEDDING_DEPLOYMENT)
+    with span("retrieval", "chroma") as fields:
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results
+        )
+        fields["documents"] = len(results["documents"][0]) if results["documents"] else 0
     return results["documents"][0] if results["documents"] else []
 
 
 def ingest_chunks_to_langchain_chroma(chunks):
     """
-    Ingests all goal history chunks into Chroma using LangChain's document format.
+    Upserts goal history chunks into Chroma using LangChain's document format.
+    Chunks are keyed by client/goal id and part, and re-ingesting a goal replaces its whole set:
+    documents of those goals that are not in `chunks` (e.g. an older chunking) are deleted.
+    Unchanged period chunks keep their text, so their embeddings come from the cache.
+    Reads and writes are split to stay within Chroma's maximum batch size.
     """
-    from langchain_rag import vectorstore
-    docs = [Document(page_content=chunk["text"], metadata={"goal_id": chunk["goal_id"], "client_id": chunk["client_id"]}) for chunk in chunks]
-    vectorstore.add_documents(docs)
-    print(f"[DEBUG] Ingested {len(docs)} documents into LangChain Chroma vectorstore.") 
\ No newline at end of file
+    from langchain.schema import Document
+    from langchain_rag import get_vectorstore
+    vectorstore = get_vectorstore()
+    if vectorstore is None:
+        raise RuntimeError("LangChain Chroma vectorstore is unavailable")
+    ids = [chunk_id(chunk) for chunk in chunks]
+    goal_ids = sorted({chunk["goal_id"] for chunk in chunks if isinstance(chunk["goal_id"], int)})
+    existing = set()
+    for goal_batch in batches(goal_ids):
+        existing.update(vectorstore.get(where={"goal_id": {"$in": goal_batch}}, include=[])["ids"])
+    for stale in batches(sorted(existing - set(ids))):
+        vectorstore.delete(ids=stale)
+    docs = [Document(page_content=chunk["text"], metadata=chunk_metadata(chunk)) for chunk in chunks]
+    for doc_batch, id_batch in zip(batches(docs), batches(ids)):
+        vectorstore.add_documents(doc_batch, ids=id_batch)
+    log_event("documents_ingested", documents=len(docs)) 
\ No newline at end of file
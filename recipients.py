@@ -0,0 +1,208 @@
+"""
+SMS recipient registry: phone numbers mapped to the client they belong to, stored in the
+recipients table (migration 0004) behind an in-process read-through cache.
+
+    python recipients.py numbers.csv
+    python recipients.py numbers.ndjson --format ndjson
+
+Import rows need phone_number and optionally client_id (empty means the advisor's general list).
+Lookups are cached per worker for RECIPIENT_CACHE_TTL_SECONDS. Writes clear the local cache once
+committed; other workers and nodes see them when their entries expire.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from sqlalchemy import text
+from dotenv import load_dotenv
+from db import get_engine
+from chat_cache import TTLCache
+from bulk_import import RowParser
+
+load_dotenv()
+
+RECIPIENT_CACHE_TTL_SECONDS = float(os.getenv("RECIPIENT_CACHE_TTL_SECONDS", "30"))
+RECIPIENT_CACHE_MAX_ENTRIES = int(os.getenv("RECIPIENT_CACHE_MAX_ENTRIES", "10000"))
+RECIPIENT_IMPORT_BATCH_SIZE = int(os.getenv("RECIPIENT_IMPORT_BATCH_SIZE", "1000"))
+
+E164_NUMBER = re.compile(r"^\+[1-9]\d{6,14}$")
+
+CLIENT_NUMBERS_SQL = text("""
+    SELECT phone_number FROM recipients WHERE client_id = :client_id AND active ORDER BY phone_number
+""")
+UNASSIGNED_NUMBERS_SQL = text("""
+    SELECT phone_number FROM recipients WHERE client_id IS NULL AND active ORDER BY phone_number
+""")
+ALL_NUMBERS_SQL = text("SELECT phone_number FROM recipients WHERE active ORDER BY phone_number")
+UPSERT_SQL = text("""
+    INSERT INTO recipients (phone_number, client_id)
+    SELECT * FROM unnest(CAST(:numbers AS varchar[]), CAST(:client_ids AS integer[]))
+    ON CONFLICT (phone_number) DO UPDATE
+        SET client_id = EXCLUDED.client_id, active = TRUE, updated_at = CURRENT_TIMESTAMP
+""")
+DEACTIVATE_OTHERS_SQL = text("""
+    UPDATE recipients SET active = FALSE, updated_at = CURRENT_TIMESTAMP
+    WHERE active AND client_id IS NOT DISTINCT FROM CAST(:client_id AS integer)
+      AND NOT (phone_number = ANY(CAST(:numbers AS varchar[])))
+""")
+
+
+def normalize_number(number):
+    """
+    E.164 form of a phone number ("+1 (555) 010-0000" -> "+15550100000"); ValueError if it isn't one.
+    """
+    cleaned = re.sub(r"[\s().-]", "", str(number))
+    if cleaned.startswith("00"):
+        cleaned = "+" + cleaned[2:]
+    if not E164_NUMBER.match(cleaned):
+        raise ValueError(f"Invalid phone number (expected E.164, e.g. +15550100000): {number}")
+    return cleaned
+
+
+def _existing_client_ids(conn, client_ids):
+    if not client_ids:
+        return set()
+    result = conn.execute(text("SELECT id FROM clients WHERE id = ANY(CAST(:ids AS integer[]))"), {"ids": sorted(client_ids)})
+    return {row.id for row in result}
+
+
+class RecipientRegistry:
+    """
+    Read-through cached access to the recipients table. Every write runs in its own transaction
+    and clears the local cache after commit, so a lookup never re-caches pre-commit data.
+    """
+
+    def __init__(self, maxsize=RECIPIENT_CACHE_MAX_ENTRIES, ttl=RECIPIENT_CACHE_TTL_SECONDS):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _lookup(self, key, sql, params=None):
+        numbers = self.cache.get(key)
+        if numbers is None:
+            with get_engine().connect() as conn:
+                numbers = tuple(conn.execute(sql, params or {}).scalars())
+            self.cache.set(key, numbers)
+        return list(numbers)
+
+    def numbers_for_client(self, client_id):
+        return self._lookup(f"client:{client_id}", CLIENT_NUMBERS_SQL, {"client_id": client_id})
+
+    def unassigned_numbers(self):
+        return self._lookup("unassigned", UNASSIGNED_NUMBERS_SQL)
+
+    def all_numbers(self):
+        return self._lookup("all", ALL_NUMBERS_SQL)
+
+    def register(self, numbers, client_id=None, replace=False):
+        """
+        Upsert numbers for client_id (None for the general list), moving any that belonged elsewhere.
+        replace=True also deactivates that owner's other numbers. Returns the normalized numbers.
+        Raises ValueError for malformed numbers or an unknown client.
+        """
+        normalized = list(dict.fromkeys(normalize_number(n) for n in numbers))
+        with get_engine().begin() as conn:
+            if client_id is not None and not _existing_client_ids(conn, {client_id}):
+                raise ValueError(f"Unknown client: {client_id}")
+            if normalized:
+                conn.execute(UPSERT_SQL, {"numbers": normalized, "client_ids": [client_id] * len(normalized)})
+            if replace:
+                conn.execute(DEACTIVATE_OTHERS_SQL, {"client_id": client_id, "numbers": normalized})
+        self.invalidate()
+        return normalized
+
+    def upsert_many(self, pairs):
+        """
+        Upsert (phone_number, client_id) pairs, already validated, in one statement; the last pair wins
+        for a repeated number. Returns the number of distinct numbers written.
+        """
+        latest = dict(pairs)
+        if latest:
+            with get_engine().begin() as conn:
+                conn.execute(UPSERT_SQL, {"numbers": list(latest), "client_ids": list(latest.values())})
+            self.invalidate()
+        return len(latest)
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+registry = RecipientRegistry()
+
+
+class RecipientImporter:
+    """
+    Validates and upserts phone_number/client_id rows a batch at a time, collecting per-row errors.
+    """
+
+    def __init__(self, registry=registry):
+        self.registry = registry
+        self.row_number = 0
+        self.imported = 0
+        self.errors = []
+
+    def process_batch(self, raw_rows):
+        rows = []
+        for raw in raw_rows:
+            self.row_number += 1
+            try:
+                if "_error" in raw:
+                    raise ValueError(raw["_error"])
+                client_id = raw.get("client_id")
+                client_id = int(client_id) if client_id not in (None, "") else None
+                rows.append((self.row_number, normalize_number(raw.get("phone_number") or ""), client_id))
+            except (ValueError, TypeError) as e:
+                self.errors.append({"row": self.row_number, "error": str(e)})
+        with get_engine().connect() as conn:
+            known = _existing_client_ids(conn, {client_id for _, _, client_id in rows if client_id is not None})
+        valid = []
+        for row_number, number, client_id in rows:
+            if client_id is not None and client_id not in known:
+                self.errors.append({"row": row_number, "error": f"Unknown client: {client_id}"})
+            else:
+                valid.append((number, client_id))
+        self.imported += len(valid)
+        self.registry.upsert_many(valid)
+
+    def summary(self):
+        return {"total": self.row_number, "imported": self.imported, "failed": len(self.errors), "errors": self.errors}
+
+
+def import_lines(lines, fmt="csv", batch_size=RECIPIENT_IMPORT_BATCH_SIZE):
+    """
+    Import from any iterable of text lines (e.g. an open file); returns the importer.
+    """
+    parser = RowParser(fmt)
+    importer = RecipientImporter()
+    batch = []
+    for line in lines:
+        try:
+            raw = parser.feed(line)
+        except (ValueError, json.JSONDecodeError) as e:
+            raw = {"_error": str(e)}
+        if raw is None:
+            continue
+        batch.append(raw)
+        if len(batch) >= batch_size:
+            importer.process_batch(batch)
+            batch = []
+    if batch:
+        importer.process_batch(batch)
+    return importer
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    arg_parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    arg_parser.add_argument("--batch-size", type=int, default=RECIPIENT_IMPORT_BATCH_SIZE)
+    args = arg_parser.parse_args()
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        importer = import_lines(sys.stdin, fmt, args.batch_size)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            importer = import_lines(f, fmt, args.batch_size)
+    print(json.dumps(importer.summary(), indent=2))
@@ -0,0 +1,139 @@
+"""
+Server-side cache for the frontend's read endpoints (/clients, goal history).
+
+ETags are derived from database state: the caller reads a cheap version of the data behind a
+scope (row counts, max ids, the latest rollup update) and the ETag is a hash of it. A matching
+If-None-Match is answered with 304 without building the body, and a change made by any worker,
+the bulk-import CLI or plain SQL changes the ETag. Bodies are cached under their ETag, so a stale
+body can never be served; old entries simply age out.
+
+Set RESPONSE_CACHE_REDIS_URL to share bodies across workers. Otherwise each process keeps its
+own bounded LRU.
+"""
+import os
+import hashlib
+import logging
+import threading
+from dotenv import load_dotenv
+from chat_cache import TTLCache
+from metrics import log_event
+
+load_dotenv()
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL")
+RESPONSE_CACHE_REDIS_PREFIX = os.getenv("RESPONSE_CACHE_REDIS_PREFIX", "response_cache:")
+
+CLIENTS_SCOPE = "clients"
+
+
+def client_scope(client_id):
+    return f"client:{client_id}"
+
+
+class LocalBackend:
+    """
+    Per-process bodies in a bounded LRU.
+    """
+    name = "local"
+
+    def __init__(self, maxsize=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.bodies = TTLCache(maxsize, ttl)
+
+    def get(self, key):
+        return self.bodies.get(key)
+
+    def set(self, key, body):
+        self.bodies.set(key, body)
+
+    def size(self):
+        return self.bodies.stats()["size"]
+
+
+class RedisBackend:
+    """
+    Bodies in Redis, shared by every worker; they expire after the TTL.
+    """
+    name = "redis"
+
+    def __init__(self, url, ttl=RESPONSE_CACHE_TTL_SECONDS, prefix=RESPONSE_CACHE_REDIS_PREFIX):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.client.ping()
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(f"{self.prefix}body:{key}")
+
+    def set(self, key, body):
+        self.client.set(f"{self.prefix}body:{key}", body, ex=self.ttl)
+
+    def size(self):
+        return None
+
+
+def _make_backend():
+    if RESPONSE_CACHE_REDIS_URL:
+        try:
+            return RedisBackend(RESPONSE_CACHE_REDIS_URL)
+        except Exception as e:
+            log_event("response_cache_fallback", logging.ERROR, error=str(e))
+    return LocalBackend()
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def etag(self, scope, data_version, variant=""):
+        """
+        Weak ETag for scope at data_version (whatever the caller read to detect changes, e.g.
+        a row count and a max timestamp); variant distinguishes query parameters.
+        """
+        digest = hashlib.sha1(repr((scope, tuple(data_version), variant)).encode("utf-8")).hexdigest()[:16]
+        return f'W/"{digest}"'
+
+    def not_modified(self, etag, if_none_match):
+        if not if_none_match:
+            return False
+        matched = if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+        if matched:
+            self._count("not_modified")
+        return matched
+
+    def get(self, etag):
+        try:
+            body = self.backend.get(etag)
+        except Exception:
+            self._count("errors")
+            body = None
+        self._count("hits" if body is not None else "misses")
+        return body
+
+    def set(self, etag, body):
+        try:
+            self.backend.set(etag, body)
+        except Exception:
+            self._count("errors")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "backend": self.backend.name,
+            "size": self.backend.size(),
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None,
+        }
+
+
+response_cache = ResponseCache(_make_backend())
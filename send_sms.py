@@ -1,5 +1,8 @@
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from requests.adapters import HTTPAdapter
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,12 +10,34 @@ load_dotenv()
 ACCOUNT_SID = os.getenv("ACCOUNT_SID")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
 MESSAGING_SERVICE_SID = os.getenv("MESSAGING_SERVICE_SID")
+# Point at a local fake Twilio (e.g. http://localhost:8081) for tests and benchmarks
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")
+TWILIO_HTTP_TIMEOUT = float(os.getenv("TWILIO_HTTP_TIMEOUT", "10"))
+TWILIO_HTTP_POOL_SIZE = int(os.getenv("TWILIO_HTTP_POOL_SIZE", "20"))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    # One client with a pooled HTTP session, shared by every send
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = TwilioHttpClient(pool_connections=True, timeout=TWILIO_HTTP_TIMEOUT)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TWILIO_HTTP_POOL_SIZE)
+                http_client.session.mount("https://", adapter)
+                http_client.session.mount("http://", adapter)
+                client = Client(ACCOUNT_SID, AUTH_TOKEN, http_client=http_client)
+                if TWILIO_API_BASE_URL:
+                    client.api.base_url = TWILIO_API_BASE_URL
+                _client = client
+    return _client
 
 def send_sms(to_num, body):
-    client = Client(ACCOUNT_SID, AUTH_TOKEN)
-    message = client.messages.create(
+    message = get_client().messages.create(
         to=to_num,
         messaging_service_sid=MESSAGING_SERVICE_SID,
         body=body
     )
-    return message.sid 
\ No newline at end of file
+    return message.sid
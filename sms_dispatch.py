@@ -0,0 +1,233 @@
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from sqlalchemy import text
+from twilio.base.exceptions import TwilioRestException
+from dotenv import load_dotenv
+from db import get_engine
+from send_sms import send_sms
+from metrics import span, log_event, sms_sends
+
+load_dotenv()
+
+SMS_MAX_CONCURRENCY = int(os.getenv("SMS_MAX_CONCURRENCY", "8"))
+SMS_RATE_PER_SEC = float(os.getenv("SMS_RATE_PER_SEC", "10"))
+SMS_MAX_RETRIES = int(os.getenv("SMS_MAX_RETRIES", "3"))
+SMS_RETRY_BACKOFF_SECONDS = float(os.getenv("SMS_RETRY_BACKOFF_SECONDS", "0.5"))
+# Finished jobs kept in memory by the worker that ran them; every worker can read any job from Postgres
+SMS_JOB_HISTORY = int(os.getenv("SMS_JOB_HISTORY", "1000"))
+# Finished jobs are deleted from sms_jobs (migration 0006) after this long
+SMS_JOB_RETENTION_HOURS = float(os.getenv("SMS_JOB_RETENTION_HOURS", "168"))
+
+INSERT_JOB_SQL = text("""
+    INSERT INTO sms_jobs (id, status, total, created_at, finished_at)
+    VALUES (:id, :status, :total, to_timestamp(:created_at), to_timestamp(:finished_at))
+""")
+INSERT_RESULT_SQL = text("""
+    INSERT INTO sms_job_results (job_id, phone_number, status, sid, error, attempts)
+    VALUES (:job_id, :number, :status, :sid, :error, :attempts)
+    ON CONFLICT (job_id, phone_number) DO NOTHING
+""")
+FINISH_JOB_SQL = text("UPDATE sms_jobs SET status = :status, finished_at = to_timestamp(:finished_at) WHERE id = :id")
+SELECT_JOB_SQL = text("""
+    SELECT id, status, total, extract(epoch FROM created_at)::float8 AS created_at,
+           extract(epoch FROM finished_at)::float8 AS finished_at
+    FROM sms_jobs WHERE id = :id
+""")
+SELECT_RESULTS_SQL = text("""
+    SELECT phone_number AS number, status, sid, error, attempts FROM sms_job_results WHERE job_id = :id ORDER BY phone_number
+""")
+PRUNE_JOBS_SQL = text("DELETE FROM sms_jobs WHERE finished_at < NOW() - make_interval(secs => :seconds)")
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all senders: at most `rate` sends per second, bursting to `rate`.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_transient(error):
+    """
+    Rate limiting, server errors and network failures are worth retrying; anything else
+    (bad number, unsubscribed recipient, auth) fails the same way every time.
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class SMSJob:
+    def __init__(self, numbers, message):
+        self.id = uuid.uuid4().hex
+        self.message = message
+        self.numbers = list(dict.fromkeys(numbers))
+        self.status = "queued"
+        self.results = {}
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        """
+        Store one number's outcome; returns True when it was the last one.
+        """
+        with self._lock:
+            self.results[result["number"]] = result
+            if len(self.results) == len(self.numbers):
+                self.status = "completed"
+                self.finished_at = time.time()
+                return True
+            return False
+
+    def to_dict(self, include_results=True):
+        with self._lock:
+            return _job_dict(self.id, self.status, len(self.numbers), self.created_at, self.finished_at,
+                             list(self.results.values()), include_results)
+
+
+def _job_dict(job_id, status, total, created_at, finished_at, results, include_results=True):
+    job = {
+        "job_id": job_id,
+        "status": status,
+        "total": total,
+        "sent": sum(1 for r in results if r["status"] == "sent"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "pending": total - len(results),
+        "created_at": created_at,
+        "finished_at": finished_at,
+    }
+    if include_results:
+        job["results"] = results
+    return job
+
+
+class SMSDispatcher:
+    """
+    Sends SMS in the background with bounded concurrency, a global messages/sec limit
+    and retry with exponential backoff for transient failures. Jobs and their results are written
+    through to Postgres, so any worker can report on any job; the worker that queued a job keeps
+    counting it in memory. A job whose worker dies mid-send stays "running".
+    """
+
+    def __init__(self, send=send_sms, max_concurrency=SMS_MAX_CONCURRENCY, rate_per_sec=SMS_RATE_PER_SEC,
+                 max_retries=SMS_MAX_RETRIES, backoff_seconds=SMS_RETRY_BACKOFF_SECONDS):
+        self.send = send
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.limiter = RateLimiter(rate_per_sec)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sms")
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def submit(self, numbers, message):
+        """
+        Record the job and queue its sends. Blocks on one insert, so call it off the event loop.
+        """
+        job = SMSJob(numbers, message)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        if not job.numbers:
+            job.status = "completed"
+            job.finished_at = time.time()
+        else:
+            job.status = "running"
+        self._store(INSERT_JOB_SQL, {"id": job.id, "status": job.status, "total": len(job.numbers),
+                                     "created_at": job.created_at, "finished_at": job.finished_at})
+        for number in job.numbers:
+            self.executor.submit(self._send_one, job, number)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job_id, include_results=True):
+        """
+        The job as a dict: live from memory if this worker runs it, otherwise from Postgres. None if unknown.
+        """
+        job = self.get(job_id)
+        if job:
+            return job.to_dict(include_results)
+        with get_engine().connect() as conn:
+            row = conn.execute(SELECT_JOB_SQL, {"id": job_id}).fetchone()
+            if row is None:
+                return None
+            results = [
+                {key: value for key, value in result._mapping.items() if value is not None}
+                for result in conn.execute(SELECT_RESULTS_SQL, {"id": job_id})
+            ]
+        return _job_dict(row.id, row.status, row.total, row.created_at, row.finished_at, results, include_results)
+
+    def _store(self, statement, params):
+        # Sends go ahead even if their progress can't be recorded
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(statement, params)
+        except Exception as e:
+            log_event("sms_job_store_failed", logging.WARNING, error=str(e))
+
+    def _record(self, job, result):
+        self._store(INSERT_RESULT_SQL, {"job_id": job.id, "sid": None, "error": None, **result})
+        if job.record(result):
+            self._store(FINISH_JOB_SQL, {"id": job.id, "status": job.status, "finished_at": job.finished_at})
+
+    def _send_one(self, job, number):
+        attempts = 0
+        while True:
+            attempts += 1
+            self.limiter.acquire()
+            try:
+                with span("sms", "send", attempt=attempts):
+                    sid = self.send(number, job.message)
+                sms_sends.inc(result="sent")
+                self._record(job, {"number": number, "status": "sent", "sid": sid, "attempts": attempts})
+                return
+            except Exception as e:
+                if attempts > self.max_retries or not is_transient(e):
+                    sms_sends.inc(result="failed")
+                    self._record(job, {"number": number, "status": "failed", "error": str(e), "attempts": attempts})
+                    return
+                sms_sends.inc(result="retried")
+                # Exponential backoff with jitter so retries don't arrive in lockstep
+                time.sleep(self.backoff_seconds * (2 ** (attempts - 1)) * (0.5 + random.random()))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status == "completed"]
+        for job_id in finished[:max(0, len(self.jobs) - SMS_JOB_HISTORY)]:
+            del self.jobs[job_id]
+        # Stored jobs are pruned at most once a minute per worker
+        if time.monotonic() - self._pruned_at > 60:
+            self._pruned_at = time.monotonic()
+            self.executor.submit(self._store, PRUNE_JOBS_SQL, {"seconds": SMS_JOB_RETENTION_HOURS * 3600})
+
+
+dispatcher = SMSDispatcher()
@@ -0,0 +1,38 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+# The app is a set of top-level modules; make them importable from the tests
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_azure_openai import start_fake_azure_openai  # noqa: E402
+
+# Modules read their settings at import, so the fake LLM and a throwaway vector store are
+# configured before any test imports them
+fake_llm = start_fake_azure_openai(dim=8)
+_store_dir = tempfile.mkdtemp(prefix="goal-pulse-tests-")
+atexit.register(shutil.rmtree, _store_dir, ignore_errors=True)
+os.environ.update({
+    "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{fake_llm.server_address[1]}",
+    "AZURE_OPENAI_KEY": "fake",
+    "AZURE_OPENAI_DEPLOYMENT": "chat",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "embed",
+    "CHROMA_PERSIST_DIR": _store_dir,
+    "EMBEDDING_CACHE_PATH": os.path.join(_store_dir, "embedding_cache.sqlite3"),
+    "METRICS_LOG_SAMPLE_RATE": "0",
+})
+
+
+@pytest.fixture
+def fake_azure_openai(monkeypatch):
+    """
+    The session's fake Azure OpenAI server with fresh stats; tests may patch reply or token_delay_ms.
+    """
+    handler = fake_llm.RequestHandlerClass
+    monkeypatch.setattr(handler, "stats", {"chat": 0, "embeddings": 0, "embedded_inputs": 0, "cancelled": 0})
+    return handler
@@ -0,0 +1,27 @@
+import pytest
+
+from bulk_import import RowParser, validate_row
+
+
+def test_csv_rows_strip_a_leading_bom():
+    parser = RowParser("csv")
+    assert parser.feed("\ufeffclient_id,goal_id,current_amount") is None
+    assert parser.feed("1,2,300.5") == {"client_id": "1", "goal_id": "2", "current_amount": "300.5"}
+    assert validate_row(parser.feed("1,2,300.5")) == {"client_id": 1, "goal_id": 2, "current_amount": 300.5}
+
+
+def test_ndjson_rows_and_blank_lines():
+    parser = RowParser("ndjson")
+    assert parser.feed("\ufeff") is None
+    assert parser.feed('{"client_id": 1, "goal_id": 2, "current_amount": 5}') == {"client_id": 1, "goal_id": 2, "current_amount": 5}
+
+
+@pytest.mark.parametrize("line", ["[1, 2, 3]", "42", '"text"', "null", "{not json"])
+def test_ndjson_values_that_are_not_objects_are_rejected(line):
+    with pytest.raises(ValueError):
+        RowParser("ndjson").feed(line)
+
+
+def test_missing_fields_are_reported():
+    with pytest.raises(ValueError, match="current_amount"):
+        validate_row({"client_id": "1", "goal_id": "2", "current_amount": ""})
@@ -0,0 +1,80 @@
+import pytest
+
+import chat_history
+from chat_history import SUMMARY_PREFIX, compact_history
+from embeddings import count_tokens
+
+
+def words(n, word="saving"):
+    return " ".join([word] * n)
+
+
+def total_tokens(turns):
+    return sum(count_tokens(content) for _, content in turns)
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """
+    Replaces the LLM summary with one that records what it was asked to fold in.
+    """
+    calls = []
+
+    def summarize(previous_summary, turns):
+        calls.append((previous_summary, list(turns)))
+        return f"{len(turns)} turns about goals"
+    monkeypatch.setattr(chat_history, "summarize_turns", summarize)
+    chat_history.summary_cache.clear()
+    return calls
+
+
+def test_history_within_budget_is_unchanged(summaries):
+    turns = [("user", "How is Jane?"), ("assistant", "On track.")]
+    compacted, usage = compact_history(turns, budget=1000)
+    assert compacted == turns
+    assert usage["history_tokens_out"] == usage["history_tokens_in"]
+    assert not summaries
+
+
+def conversation(n):
+    return [("user" if i % 2 == 0 else "assistant", f"turn {i} " + words(10)) for i in range(n)]
+
+
+def budget_for(turns):
+    # Room for the summary plus about a third of the turns
+    return chat_history.CHAT_SUMMARY_MAX_TOKENS + total_tokens(turns) // 3
+
+
+def test_older_turns_are_summarized_and_recent_ones_kept(summaries):
+    turns = conversation(30)
+    budget = budget_for(turns)
+    compacted, usage = compact_history(turns, budget=budget)
+    role, summary = compacted[0]
+    assert role == "system" and summary.startswith(SUMMARY_PREFIX)
+    assert compacted[1:] == turns[-len(compacted) + 1:]
+    assert usage["summarized_messages"] == len(turns) - (len(compacted) - 1)
+    assert total_tokens(compacted) == usage["history_tokens_out"] <= budget
+
+
+def test_long_recent_turns_are_clipped_to_the_budget(summaries):
+    turns = [("user", words(50)), ("assistant", words(2000)), ("user", words(2000))]
+    compacted, usage = compact_history(turns, budget=400)
+    assert usage["clipped_messages"] == 2
+    assert [content.endswith(" ...") for _, content in compacted[-2:]] == [True, True]
+    assert total_tokens(compacted) <= 400
+    # The two must-keep turns share what the summary leaves
+    assert abs(count_tokens(compacted[-1][1]) - count_tokens(compacted[-2][1])) <= 2
+
+
+def test_rolling_summary_only_folds_in_new_turns(summaries):
+    turns = conversation(30)
+    budget = budget_for(turns)
+    compact_history(turns, session_id="s1", budget=budget)
+    _, usage = compact_history(turns, session_id="s1", budget=budget)
+    assert usage["summary_cached"] and len(summaries) == 1
+
+    longer = conversation(32)
+    compact_history(longer, session_id="s1", budget=budget)
+    previous, folded = summaries[-1]
+    assert previous == "%d turns about goals" % len(summaries[0][1])
+    assert folded == longer[len(summaries[0][1]):len(summaries[0][1]) + len(folded)]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import api
+import intent_router
+import langchain_rag
+from chat_cache import answer_cache, retrieval_cache
+
+REPLY = "Jane is on track for retirement and ahead on her house goal this quarter."
+
+
+@pytest.fixture(scope="module")
+def rag():
+    assert langchain_rag.init_rag(), langchain_rag.rag_status()["error"]
+    langchain_rag.vectorstore.add_texts(
+        ["Jane Doe retirement goal: $84,500 of $100,000.", "Jane Doe house goal: $30,000 of $50,000."],
+        metadatas=[{"client_id": 1, "goal_id": 1}, {"client_id": 1, "goal_id": 2}],
+        ids=["1_1", "1_2"],
+    )
+    return langchain_rag
+
+
+@pytest.fixture
+def llm(rag, fake_azure_openai, monkeypatch):
+    monkeypatch.setattr(fake_azure_openai, "reply", REPLY)
+    answer_cache.clear()
+    retrieval_cache.clear()
+    return fake_azure_openai
+
+
+def collect(stream):
+    async def run():
+        return [event async for event in stream]
+    return asyncio.run(run())
+
+
+def test_stream_yields_usage_then_tokens_then_sources(llm):
+    events = collect(langchain_rag.langchain_ai_chat_stream([{"role": "user", "content": "How is Jane's retirement?"}]))
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "usage" and kinds[-1] == "sources"
+    assert set(kinds[1:-1]) == {"token"} and len(kinds) > 3
+    assert "".join(payload for kind, payload in events if kind == "token") == REPLY
+    assert {doc.metadata["goal_id"] for doc in events[-1][1]} == {1, 2}
+
+
+def test_condense_tokens_stay_out_of_the_stream(llm):
+    messages = [
+        {"role": "user", "content": "How is Jane doing?"},
+        {"role": "assistant", "content": "Jane is doing well."},
+        {"role": "user", "content": "And her house goal?"},
+    ]
+    events = collect(langchain_rag.langchain_ai_chat_stream(messages))
+    # The condense call and the answer call both return REPLY; only the answer is streamed
+    assert llm.stats["chat"] == 2
+    assert "".join(payload for kind, payload in events if kind == "token") == REPLY
+
+
+def test_repeated_question_streams_the_cached_answer(llm):
+    messages = [{"role": "user", "content": "Summarise Jane's goals"}]
+    collect(langchain_rag.langchain_ai_chat_stream(messages))
+    calls = llm.stats["chat"]
+    events = collect(langchain_rag.langchain_ai_chat_stream(messages))
+    assert llm.stats["chat"] == calls
+    assert [kind for kind, _ in events] == ["usage", "token", "sources"]
+    assert events[1][1] == REPLY
+
+
+def wait_for_cancel(llm, timeout=2):
+    # The fake notices the dropped connection on its next write
+    deadline = time.monotonic() + timeout
+    while not llm.stats["cancelled"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert llm.stats["cancelled"] == 1
+
+
+def test_closing_the_stream_cancels_the_llm_call(llm, monkeypatch):
+    monkeypatch.setattr(llm, "reply", " ".join(["word"] * 200))
+    monkeypatch.setattr(llm, "token_delay_ms", 10)
+
+    async def read_two_tokens():
+        stream = langchain_rag.langchain_ai_chat_stream([{"role": "user", "content": "Explain Jane's plan"}])
+        tokens = []
+        async for kind, payload in stream:
+            if kind == "token":
+                tokens.append(payload)
+                if len(tokens) == 2:
+                    break
+        await stream.aclose()
+        return tokens
+
+    assert len(asyncio.run(read_two_tokens())) == 2
+    wait_for_cancel(llm)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def no_clients(monkeypatch):
+    # Name matching would otherwise load client names from Postgres
+    monkeypatch.setattr(intent_router, "_known_clients", lambda conn=None: intent_router.name_index([]))
+
+
+class FakeRequest:
+    """
+    Stands in for the Starlette request; reports a disconnect after `connected_for` checks.
+    """
+
+    def __init__(self, connected_for=None):
+        self.connected_for = connected_for
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.connected_for is not None and self.checks > self.connected_for
+
+
+def stream_endpoint(request, content):
+    async def run():
+        response = await api.ai_chat_stream(api.ChatRequest(messages=[{"role": "user", "content": content}]), request)
+        return "".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(run())
+
+
+def test_endpoint_sends_usage_tokens_sources_done(llm, no_clients):
+    events = parse_sse(stream_endpoint(FakeRequest(), "Explain compound interest"))
+    names = [name for name, _ in events]
+    assert names[0] == "usage" and names[-2:] == ["sources", "done"]
+    assert set(names[1:-2]) == {"token"}
+    assert "".join(data["token"] for name, data in events if name == "token") == REPLY
+    assert events[-1][1]["path"] == "rag"
+
+
+def test_endpoint_stops_on_disconnect(llm, no_clients, monkeypatch):
+    monkeypatch.setattr(llm, "reply", " ".join(["word"] * 200))
+    monkeypatch.setattr(llm, "token_delay_ms", 10)
+    events = parse_sse(stream_endpoint(FakeRequest(connected_for=3), "Explain Jane's long-term plan"))
+    names = [name for name, _ in events]
+    assert "done" not in names and "sources" not in names
+    assert names.count("token") == 2
+    wait_for_cancel(llm)
@@ -0,0 +1,89 @@
+import pytest
+
+import intent_router
+from intent_router import classify, find_clients, name_index
+
+JANE = (1, "Jane Doe")
+JOHN = (2, "John Smith")
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("How many clients do I have?", "client_count"),
+    ("What's the total number of clients?", "client_count"),
+    ("client count", "client_count"),
+    ("List all my clients", "client_list"),
+    ("Who are my clients?", "client_list"),
+    ("Can you show me the names of all clients?", "client_list"),
+    ("Show totals by goal type", "totals_by_goal_type"),
+    ("What are the total saved and target amounts per type?", "totals_by_goal_type"),
+    ("Which goals are off track?", "goals_off_track"),
+    ("Which of all my clients are off track?", "goals_off_track"),
+    ("How many clients are off track?", "goals_off_track"),
+    ("Are any goals at risk or falling short?", "goals_off_track"),
+])
+def test_unscoped_intents(question, intent):
+    assert classify(question, []) == intent
+
+
+@pytest.mark.parametrize("question", [
+    "How many clients have retirement goals?",
+    "How many clients are over 60?",
+    "List clients with education goals",
+    "Are all my clients on track?",
+    "Total retirement savings by goal type for clients in Toronto",
+    "Why is the house goal behind?",
+    "Suggest how to catch up on retirement",
+    "What is compound interest?",
+])
+def test_qualified_or_open_questions_go_to_rag(question):
+    assert classify(question, []) is None
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("How is Jane doing?", "client_goal_progress"),
+    ("What's the status of Jane's goals?", "client_goal_progress"),
+    ("Is Jane behind on anything?", "goals_off_track"),
+    ("What does Jane like?", None),
+    ("Should Jane save more?", None),
+])
+def test_named_client_intents(question, intent):
+    assert classify(question, [JANE]) == intent
+
+
+def test_several_or_ambiguous_clients_go_to_rag():
+    assert classify("How are Jane and John doing?", [JANE, JOHN]) is None
+    assert classify("How is Jane doing?", None) is None
+
+
+def test_scope_skips_aggregates_and_limits_to_the_client():
+    assert classify("How many clients do I have?", [JANE], scoped=True) is None
+    assert classify("Which goals are behind?", [JANE], scoped=True) == "goals_off_track"
+    assert classify("How is she doing?", [JANE], scoped=True, follow_up=True) == "client_goal_progress"
+
+
+@pytest.mark.parametrize("question, clients, intent", [
+    ("Which of her goals are behind?", [], None),
+    ("Which goals are behind?", [], None),
+    ("How is that client doing?", [JANE], None),
+    ("How is John doing?", [JOHN], "client_goal_progress"),
+    ("How many clients do I have?", [], "client_count"),
+])
+def test_follow_ups_only_route_self_contained_questions(question, clients, intent):
+    assert classify(question, clients, follow_up=True) == intent
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    index = name_index([JANE, JOHN, (3, "Jane Roe"), (4, "Maria Lopez")])
+    monkeypatch.setattr(intent_router, "_known_clients", lambda conn=None: index)
+
+
+def test_find_clients_by_full_and_unique_first_name(clients):
+    assert find_clients(None, "How is Jane Doe doing?") == [JANE]
+    assert find_clients(None, "Compare John Smith and Maria") == [JOHN, (4, "Maria Lopez")]
+    assert find_clients(None, "What is compound interest?") == []
+
+
+def test_find_clients_ambiguous_first_name(clients):
+    assert find_clients(None, "How is Jane doing?") is None
+    assert find_clients(None, "Johnny asked about Janet") == []
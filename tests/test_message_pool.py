@@ -0,0 +1,66 @@
+import pytest
+
+from message_pool import MessagePool, Variant, fill, is_repeat, parse_templates, pool_key, progress_bucket
+
+
+def test_parse_templates_keeps_lines_with_both_slots():
+    completion = "\n".join([
+        "Here are some messages:",
+        '1. "Great work {name}, you are at {percent}% of your goal!"',
+        "- {name}, {percent}% done and counting 🎉",
+        "* Keep going {name}!",
+        "{name} hit {percent}% — see {link}",
+        "2) Great work {name}, you are at {percent}% of your goal!",
+        "",
+        "{name}: " + "x" * 400 + " {percent}%",
+    ])
+    assert parse_templates(completion) == [
+        "Great work {name}, you are at {percent}% of your goal!",
+        "{name}, {percent}% done and counting 🎉",
+    ]
+
+
+@pytest.mark.parametrize("completion", [None, "", "No slots here at all."])
+def test_parse_templates_without_usable_lines(completion):
+    assert parse_templates(completion) == []
+
+
+@pytest.mark.parametrize("last_message, repeat", [
+    ("Great work Jane, you are at 42.5% of your goal!", True),
+    ("Great work Bob, you are at 7% of your goal!", True),
+    ("Great job Jane, you are at 42.5% of your goal!", False),
+    (None, False),
+    ("", False),
+])
+def test_is_repeat_ignores_the_filled_slots(last_message, repeat):
+    assert is_repeat("Great work {name}, you are at {percent}% of your goal!", last_message) is repeat
+
+
+def test_fill_uses_the_first_name_and_model_braces_stay_literal():
+    client = {"client_name": "Jane Doe"}
+    assert fill("{name} is at {percent}%", client, 42.5) == "Jane is at 42.5%"
+    assert fill("{name} {0} {percent}", client, 10.0) == "Jane {0} 10"
+
+
+@pytest.mark.parametrize("percent, bucket", [(-5, 0), (0, 0), (24.9, 0), (25, 25), (99.9, 75), (100, 100), (180, 100)])
+def test_progress_bucket(percent, bucket):
+    assert progress_bucket(percent, size=25) == bucket
+
+
+def test_pick_skips_the_clients_last_message_and_retires_worn_templates():
+    pool = MessagePool(target=2, minimum=0, max_uses=2, enabled=True)
+    client = {"client_name": "Jane Doe", "goal_type": " Retirement ", "last_message_sent": "Nice, Bob! 10% there."}
+    key = pool_key(client["goal_type"], "increased", 60)
+    pool._variants[key] = [Variant(1, "Nice, {name}! {percent}% there."), Variant(2, "{name} is at {percent}%.")]
+
+    assert pool.pick(client, 60, "increased") == "Jane is at 60%."
+    assert pool.pick(client, 60, "increased") == "Jane is at 60%."
+    # Template 2 has been used max_uses times and template 1 repeats the last message
+    assert pool.pick(client, 60, "increased") is None
+    assert [v.id for v in pool._variants[key]] == [1]
+    assert pool._unflushed == {2: 2}
+
+
+def test_disabled_pool_never_picks():
+    pool = MessagePool(minimum=0, enabled=False)
+    assert pool.pick({"client_name": "Jane", "goal_type": "Home", "last_message_sent": None}, 50, "same") is None
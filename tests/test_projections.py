@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from projections import is_goal_on_track, project_goals, projection_curves
+
+
+def simulate(balance, contribution, months, annual_rate):
+    # Month by month: growth, then the month's contribution
+    for _ in range(months):
+        balance = balance * (1 + annual_rate / 12) + contribution
+    return balance
+
+
+GOALS = [
+    # current, monthly contribution, months, annual rate, goal
+    (10_000, 500, 120, 0.06, 120_000),
+    (50_000, 0, 24, 0.04, 40_000),
+    (1_000, 200, 36, 0.0, 10_000),
+    (5_000, 100, 0, 0.05, 8_000),
+]
+
+
+def test_project_goals_matches_a_month_by_month_simulation():
+    projected = project_goals(*zip(*GOALS))
+    for i, (current, contribution, months, rate, goal) in enumerate(GOALS):
+        expected = simulate(current, contribution, months, rate)
+        assert projected["future_value"][i] == pytest.approx(expected)
+        assert projected["on_track"][i] == (expected >= goal)
+        assert projected["shortfall"][i] == pytest.approx(max(goal - expected, 0))
+
+
+def test_required_contribution_reaches_the_goal():
+    projected = project_goals(*zip(*GOALS))
+    for i, (current, _, months, rate, goal) in enumerate(GOALS):
+        required = projected["required_monthly_contribution"][i]
+        if months == 0:
+            # Nothing left to contribute over: the whole gap is due now
+            assert required == pytest.approx(goal - current)
+        elif projected["on_track"][i] and simulate(current, 0, months, rate) >= goal:
+            assert required == 0
+        else:
+            assert simulate(current, required, months, rate) == pytest.approx(goal)
+
+
+def test_scalars_and_arrays_agree():
+    current, contribution, months, rate, goal = GOALS[0]
+    scalar = project_goals(current, contribution, months, rate, goal)
+    assert scalar["future_value"] == pytest.approx(project_goals(*zip(*GOALS))["future_value"][0])
+    assert is_goal_on_track(current, contribution, months, rate, goal) is False
+    assert is_goal_on_track(*GOALS[1]) is True
+
+
+def test_projection_curves_start_today_and_follow_the_simulation():
+    current, contribution, rate = np.array([10_000.0, 1_000.0]), np.array([500.0, 200.0]), np.array([0.06, 0.0])
+    curves = projection_curves(current, contribution, rate, 24)
+    assert curves.shape == (2, 25)
+    assert list(curves[:, 0]) == [10_000, 1_000]
+    for i in range(2):
+        assert curves[i, 12] == pytest.approx(simulate(current[i], contribution[i], 12, rate[i]))
+        assert curves[i, 24] == pytest.approx(simulate(current[i], contribution[i], 24, rate[i]))
@@ -0,0 +1,107 @@
+"""
+The single persistent Chroma store shared by langchain_rag and rag_utils, with tunable HNSW
+parameters and a warm load so the index is in memory before the first chat request.
+"""
+import os
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+from metrics import log_event
+
+load_dotenv()
+
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+COLLECTION_NAME = "goals_with_history"
+
+# Graph degree and build-time beam width only apply when the collection is created (a changed
+# value needs a rebuild); the search beam width is applied on every start. Defaults are Chroma's.
+VECTOR_HNSW_SPACE = os.getenv("VECTOR_HNSW_SPACE", "l2")
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))
+VECTOR_HNSW_CONSTRUCTION_EF = int(os.getenv("VECTOR_HNSW_CONSTRUCTION_EF", "100"))
+VECTOR_HNSW_SEARCH_EF = int(os.getenv("VECTOR_HNSW_SEARCH_EF", "100"))
+
+_client = None
+_collections = {}
+_lock = threading.RLock()
+
+
+def hnsw_configuration(m=None, construction_ef=None, search_ef=None, space=None):
+    return {"hnsw": {
+        "space": space or VECTOR_HNSW_SPACE,
+        "max_neighbors": m or VECTOR_HNSW_M,
+        "ef_construction": construction_ef or VECTOR_HNSW_CONSTRUCTION_EF,
+        "ef_search": search_ef or VECTOR_HNSW_SEARCH_EF,
+    }}
+
+
+def get_chroma_client():
+    """
+    Process-wide persistent Chroma client for CHROMA_PERSIST_DIR, created on first use.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+    return _client
+
+
+def max_batch_size():
+    """
+    The most records Chroma accepts in one add, upsert or delete call.
+    """
+    return get_chroma_client().get_max_batch_size()
+
+
+def batches(items, size=None):
+    """
+    Consecutive slices of items, each small enough for one Chroma write.
+    """
+    size = size or max_batch_size()
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def get_collection(name=COLLECTION_NAME):
+    """
+    The collection, created with the configured HNSW parameters if missing. An existing collection
+    gets the configured search beam width; build parameters that differ are reported, not changed.
+    The handle is reused for the life of the process.
+    """
+    collection = _collections.get(name)
+    if collection is None:
+        with _lock:
+            collection = _collections.get(name)
+            if collection is None:
+                collection = _collections[name] = _open_collection(name)
+    return collection
+
+
+def _open_collection(name):
+    configuration = hnsw_configuration()
+    collection = get_chroma_client().get_or_create_collection(name, configuration=configuration)
+    current = (collection.configuration or {}).get("hnsw") or {}
+    wanted = configuration["hnsw"]
+    if current.get("ef_search") != wanted["ef_search"]:
+        collection.modify(configuration={"hnsw": {"ef_search": wanted["ef_search"]}})
+    stale = {key: current.get(key) for key in ("space", "max_neighbors", "ef_construction") if current.get(key) != wanted[key]}
+    if stale:
+        log_event("vector_store_build_params_differ", logging.WARNING, collection=name, built_with=stale,
+                  configured={key: wanted[key] for key in stale})
+    return collection
+
+
+def warm_load(name=COLLECTION_NAME):
+    """
+    Open the store and run one nearest-neighbour query, so the HNSW segment is loaded from disk
+    now rather than on the first chat request. Returns what was loaded and how long it took.
+    """
+    started = time.perf_counter()
+    collection = get_collection(name)
+    count = collection.count()
+    if count:
+        sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is not None and len(sample):
+            collection.query(query_embeddings=[list(sample[0])], n_results=1, include=[])
+    return {"collection": name, "documents": count, "load_seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import text
+from dotenv import load_dotenv
+from db import get_engine
+from metrics import log_event
+from rag_utils import build_goal_chunks, build_client_summary_chunk, ingest_chunks_to_langchain_chroma
+from vector_store import CHROMA_PERSIST_DIR, get_collection
+
+load_dotenv()
+
+# Watermark file lives next to the persisted Chroma store so the two stay in step
+VECTOR_SYNC_STATE_PATH = os.getenv("VECTOR_SYNC_STATE_PATH", os.path.join(CHROMA_PERSIST_DIR, "vector_sync_state.json"))
+
+_sync_lock = threading.Lock()
+# Outcome of the last sync in this process, reported by /readyz
+_sync_status = {"last_synced_at": None, "last_chunks": None, "last_error": None, "running": False}
+
+
+def load_sync_state():
+    try:
+        with open(VECTOR_SYNC_STATE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_sync_state(state):
+    os.makedirs(os.path.dirname(VECTOR_SYNC_STATE_PATH) or ".", exist_ok=True)
+    tmp_path = VECTOR_SYNC_STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, VECTOR_SYNC_STATE_PATH)
+
+
+def _changed_goal_ids(conn, state):
+    """
+    Goals whose latest-progress rollup changed at or after the watermark (new history, or a message
+    filled in later), plus goals created since the last sync.
+    The watermark is inclusive so rows sharing its timestamp are never missed; upserts make the overlap harmless.
+    """
+    result = conn.execute(text("""
+        SELECT goal_id FROM goal_progress_latest WHERE updated_at >= :watermark
+        UNION
+        SELECT id FROM goals WHERE id > :max_goal_id
+    """), {
+        "watermark": datetime.fromisoformat(state["history_watermark"]),
+        "max_goal_id": state.get("max_goal_id", 0),
+    })
+    return sorted(row[0] for row in result)
+
+
+def sync_vector_index(goal_ids=None, full=False):
+    """
+    Re-chunk and upsert only goals that changed since the last sync.
+    goal_ids forces those goals to be refreshed (e.g. right after an update);
+    full=True, a missing watermark or an empty collection (store moved, replaced or wiped while the
+    watermark survived) rebuilds every goal.
+    Returns the number of chunks upserted.
+    """
+    with _sync_lock:
+        _sync_status["running"] = True
+        try:
+            count = _sync(goal_ids, full)
+        except Exception as e:
+            _sync_status["last_error"] = str(e)
+            raise
+        finally:
+            _sync_status["running"] = False
+        _sync_status.update(last_synced_at=time.time(), last_chunks=count, last_error=None)
+        return count
+
+
+def _sync(goal_ids, full):
+    state = load_sync_state()
+    engine = get_engine()
+    with engine.connect() as conn:
+        # Read the new watermark before chunking so rows written meanwhile are picked up next time
+        marks = conn.execute(text("""
+            SELECT (SELECT max(updated_at) FROM goal_progress_latest) AS history_watermark,
+                   (SELECT COALESCE(max(id), 0) FROM goals) AS max_goal_id
+        """)).fetchone()
+        full = full or "history_watermark" not in state or get_collection().count() == 0
+        if full:
+            chunks = build_goal_chunks(conn)
+        else:
+            changed = set(_changed_goal_ids(conn, state))
+            if goal_ids:
+                changed.update(goal_ids)
+            chunks = build_goal_chunks(conn, sorted(changed)) if changed else []
+        summary_chunk = build_client_summary_chunk(conn)
+
+    summary_hash = hashlib.sha256(summary_chunk["text"].encode("utf-8")).hexdigest()
+    if full or summary_hash != state.get("summary_hash"):
+        chunks.append(summary_chunk)
+    if chunks:
+        ingest_chunks_to_langchain_chroma(chunks)
+
+    state["history_watermark"] = (marks.history_watermark or datetime.min).isoformat()
+    state["max_goal_id"] = marks.max_goal_id
+    state["summary_hash"] = summary_hash
+    save_sync_state(state)
+    return len(chunks)
+
+
+def sync_goals_quietly(goal_ids):
+    """
+    Background-task entry point: refresh the given goals without failing the caller.
+    """
+    try:
+        sync_vector_index(goal_ids=goal_ids)
+    except Exception as e:
+        log_event("vector_sync_failed", logging.ERROR, error=str(e))
+
+
+def sync_status():
+    state = load_sync_state()
+    return dict(_sync_status, history_watermark=state.get("history_watermark"))